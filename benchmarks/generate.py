@@ -0,0 +1,120 @@
+"""
+- Generates synthetic users with the same userstats/userdata layout as the json datafiles
+- Generation is seeded, the same size and seed always give the same user
+- Usage : python benchmarks/generate.py [--sizes 1000,100000,1000000] [--seed 0] [--database database]
+- Users are named bench_<size> and added to the users file of the database directory (password 'bench')
+"""
+
+import numpy as np
+import pandas as pd
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from login import format_userdata, compact_userdata
+from tasks import taskcategories, importancecategories
+
+# task counts of the standard benchmark users
+SIZES = [1000, 100000, 1000000]
+
+
+def generate_userdata(size, seed=0):
+    """
+    - Returns a typed userdata dataframe (same columns and dtypes as login_user loads) with size tasks
+    - About 85% of the tasks are completed, roughly a third of them late, 2% are outliers
+    """
+
+    rng = np.random.default_rng(seed)
+
+    start = pd.Timestamp("2022-01-01") + pd.to_timedelta(rng.integers(0, 3 * 365 * 24 * 60, size), unit="min")
+    deadline = start + pd.to_timedelta(rng.integers(15, 72 * 60, size), unit="min")
+
+    # completion is spread around the deadline but never before the start
+    completed_on = deadline + pd.to_timedelta(rng.normal(-30, 90, size).round(), unit="min")
+    completed_on = completed_on.where(completed_on >= start, start)
+
+    ongoing = rng.random(size) < 0.15
+    completed_on = completed_on.where(~ongoing)
+
+    userdata = pd.DataFrame(
+        {
+            "Task Name": [f"Task {i}" for i in range(1, size + 1)],
+            "Task Type": np.array(taskcategories, dtype=object)[rng.integers(0, len(taskcategories), size)],
+            "Task Importance": np.array(importancecategories, dtype=object)[rng.integers(0, len(importancecategories), size)],
+            "Start Time": start,
+            "Deadline": deadline,
+            "Completed On": completed_on,
+            "Status": np.where(ongoing, "Ongoing", "Completed").astype(object),
+            "Was Late": pd.array(completed_on > deadline, dtype="boolean"),
+            "Duration": completed_on - start,
+            "Is Outlier": rng.random(size) < 0.02,
+            "Notes": np.where(rng.random(size) < 0.1, "Generated note", "").astype(object),
+        },
+        index=pd.RangeIndex(1, size + 1),
+    )
+
+    userdata.loc[ongoing, "Was Late"] = pd.NA
+
+    return compact_userdata(userdata)
+
+
+def generate_userstats(username, userdata):
+    """
+    - Returns the userstats matching the generated userdata
+    """
+
+    completed = int((userdata["Status"] != "Ongoing").sum())
+    late = int(userdata["Was Late"].sum())
+    total = len(userdata)
+
+    return {
+        "Username": username,
+        "Total Tasks": total,
+        "Completed Tasks": completed,
+        "Ongoing Tasks": total - completed,
+        "Late Tasks": late,
+        "On-Time Rate (%)": (completed - late) * 100 / total if total else 0,
+    }
+
+
+def write_user(database, size, seed=0):
+    """
+    - Writes the datafile of bench_<size> to the database directory and adds the user to its users file
+    - Returns the username
+    """
+
+    username = f"bench_{size}"
+    userdata = generate_userdata(size, seed)
+
+    with open(os.path.join(database, f"{username}.json"), "w") as f:
+        json.dump({"userstats": generate_userstats(username, userdata), "userdata": format_userdata(userdata).to_dict(orient="index")}, f, indent=4)
+
+    users_file = os.path.join(database, "users.csv")
+
+    if not os.path.exists(users_file):
+        with open(users_file, "w") as f:
+            f.write("username,password\n")
+
+    with open(users_file, "r") as f:
+        registered = f.read().split()
+
+    if f"{username},bench" not in registered:
+        with open(users_file, "a") as f:
+            f.write(f"{username},bench\n")
+
+    return username
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Generate synthetic benchmark users")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="comma seperated task counts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database", default="database", help="database directory to write the users to")
+    args = parser.parse_args()
+
+    for size in map(int, args.sizes.split(",")):
+        print(f"Generated {write_user(args.database, size, args.seed)}")
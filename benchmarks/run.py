@@ -0,0 +1,205 @@
+"""
+- Times the hot paths of the task analyzer on generated users (see generate.py)
+- Interactive flows are driven with scripted stdin, computations use the headless functions
+- Runs in a temporary database directory, the real database is never touched
+- Results are written as json so runs can be compared over time
+- Usage : python benchmarks/run.py [--sizes 1000,100000,1000000] [--repeat 3] [--output path]
+"""
+
+import pandas as pd
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from generate import SIZES, write_user
+from login import Login, DATABASE
+from analyse import analyse, detailed_analysis, percentile_analysis
+from aggregates import Aggregates
+from tasks import query, quick_view, quick_view_ids, overdue_tasks, due_tasks
+from pager import page
+from orders import Orders, QUICK_VIEW
+from masks import Masks
+from deadlines import DeadlineIndex
+from trends import Trends
+from exporter import export_frame
+from importer import read_tasks, parse_tasks
+from archive import analyse_archives
+
+# directory the results are written to by default
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def scripted(answers, function, *args):
+    """
+    - Runs function with answers fed to its input() prompts and its output discarded
+    """
+
+    stdin = sys.stdin
+    sys.stdin = io.StringIO("".join(f"{answer}\n" for answer in answers))
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return function(*args)
+
+    finally:
+        sys.stdin = stdin
+
+
+def measure(function, repeat, setup=None):
+    """
+    - Runs function repeat times (setup before each run, not timed)
+    - Returns the wall time of each run in seconds
+    """
+
+    times = []
+
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    return times
+
+
+def remove(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def bench_size(size, repeat):
+    """
+    - Generates a user with size tasks in the current database directory and times every hot path on it
+    - Returns a dict of path : list of run times
+    """
+
+    username = write_user(DATABASE, size)
+    login = [username, "bench"]
+    snapshot = f"{DATABASE}/{username}.npz"
+    export = os.path.abspath(f"export_{size}")
+
+    results = {}
+
+    # login without the snapshot parses the json datafile (small datafiles never get a snapshot)
+    # userdata is built lazily, so it is accessed to time the full load
+    results["login_user (json)"] = measure(lambda: scripted(login, Login).userdata, repeat, setup=lambda: remove(snapshot))
+    results["login_user (snapshot)"] = measure(lambda: scripted(login, Login).userdata, repeat)
+    results["login_user (stats only)"] = measure(lambda: scripted(login, Login), repeat)
+
+    user = scripted(login, Login)
+    userdata = user.userdata
+
+    results["analyse"] = measure(lambda: analyse(userdata, "all", "all"), repeat)
+    results["detailed_analysis"] = measure(lambda: detailed_analysis(userdata), repeat)
+
+    # aggregates (with the quantile sketches) are built once per session, then percentiles only read the sketches
+    aggregates = Aggregates(userdata)
+    results["aggregates (build)"] = measure(lambda: Aggregates(userdata), repeat)
+    results["percentiles (sketches)"] = measure(lambda: percentile_analysis(userdata, ["Task Importance", "Task Type"], aggregates), repeat)
+
+    sorters = [("Deadline", True), ("Task Name", False)]
+    results["view_tasks (sort)"] = measure(lambda: query(userdata, "all", "all", sorters), repeat)
+    results["view_tasks (filter + sort)"] = measure(lambda: query(userdata, ["High", "Medium"], ["Work", "Study"], sorters, "late"), repeat)
+
+    # masks are built once per session, then every view is a combination of them
+    masks = Masks(userdata)
+    results["view_tasks (masks build)"] = measure(lambda: Masks(userdata), repeat)
+    results["view_tasks (masks filter + sort)"] = measure(lambda: query(userdata, ["High", "Medium"], ["Work", "Study"], sorters, "late", masks), repeat)
+
+    # sorted orders are built once per session (first use), then read in order
+    orders = Orders()
+    results["quick_view (sort)"] = measure(lambda: quick_view(userdata), repeat)
+    results["quick_view (order build)"] = measure(lambda: Orders().get(userdata, QUICK_VIEW, na_first=True), repeat)
+    orders.get(userdata, QUICK_VIEW, na_first=True)
+    results["quick_view (kept order)"] = measure(lambda: quick_view(userdata, orders), repeat)
+    results["quick_view (kept order, first 50)"] = measure(lambda: userdata.loc[orders.get(userdata, QUICK_VIEW, na_first=True).ids(0, 50)], repeat)
+    # the quick view listing as printed before paging, and its first page as shown now
+    results["quick_view (print all)"] = measure(lambda: str(quick_view(userdata, orders)), repeat)
+    results["quick_view (first page)"] = measure(lambda: str(page(userdata, quick_view_ids(userdata, orders), 0)), repeat)
+    orders.get(userdata, sorters)
+    results["view_tasks (kept order)"] = measure(lambda: query(userdata, "all", "all", sorters, "all", masks, orders), repeat)
+    results["view_tasks (kept order filter)"] = measure(lambda: query(userdata, ["High", "Medium"], ["Work", "Study"], sorters, "late", masks, orders), repeat)
+
+    # generated deadlines are in 2022-2024, so the overdue/due cut is put in the middle of them
+    now = pd.Timestamp("2023-07-01")
+    deadlines = DeadlineIndex(userdata)
+    results["overdue (scan)"] = measure(lambda: overdue_tasks(userdata, None, now), repeat)
+    results["overdue (index)"] = measure(lambda: overdue_tasks(userdata, deadlines, now), repeat)
+    results["due 24h (scan)"] = measure(lambda: due_tasks(userdata, 24, None, now), repeat)
+    results["due 24h (index)"] = measure(lambda: due_tasks(userdata, 24, deadlines, now), repeat)
+
+    # rollups are built once per session, then every trend only reads the bucket rows
+    trends = Trends(userdata)
+    results["trend (rollups build)"] = measure(lambda: Trends(userdata), repeat)
+    results["trend monthly by type (rollups)"] = measure(lambda: trends.trend("monthly", "type"), repeat)
+    results["trend daily (rollups)"] = measure(lambda: trends.trend("daily"), repeat)
+
+    results["export_data"] = measure(user.export_data, repeat)
+    results["custom_export"] = measure(lambda: scripted(["", export], user.custom_export, userdata), repeat, setup=lambda: remove(f"{export}.json"))
+
+    # the tasks exported as csv are imported back (read, validated and parsed, not added)
+    export_frame(userdata, f"{export}.csv", "csv")
+    results["import_tasks (csv)"] = measure(lambda: parse_tasks(read_tasks(f"{export}.csv"), 1), repeat)
+    # same file analysed a chunk at a time, as an archive
+    results["archive_analysis (csv, chunked)"] = measure(lambda: analyse_archives([f"{export}.csv"], True), repeat)
+
+    return results
+
+
+def summary(times):
+    return {"min": min(times), "mean": sum(times) / len(times), "runs": times}
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark the task analyzer hot paths")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="comma seperated task counts")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each path")
+    parser.add_argument("--output", default=None, help="json file to write the results to")
+    args = parser.parse_args()
+
+    output = args.output or os.path.join(RESULTS, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    report = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": {},
+    }
+
+    cwd = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as workspace:
+        # the program uses paths relative to the working directory
+        os.chdir(workspace)
+        os.mkdir(DATABASE)
+
+        try:
+            for size in map(int, args.sizes.split(",")):
+                results = {path: summary(times) for path, times in bench_size(size, args.repeat).items()}
+                report["results"][str(size)] = results
+
+                for path, result in results.items():
+                    print(f"{size:>9} tasks  {path:<36} min {result['min']:.4f}s  mean {result['mean']:.4f}s")
+
+        finally:
+            os.chdir(cwd)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+
+    with open(output, "w") as f:
+        json.dump(report, f, indent=4)
+
+    print(f"\nResults written to {output}")
@@ -0,0 +1,431 @@
+"""
+- Running aggregates of the tasks of a user per (importance, type) cell, used by the analysis instead of going through all the tasks
+- Built once from the userdata, then every task change (add, complete, uncomplete, re-deadline, outlier toggle, delete)
+  updates the cell of the task in O(1) by removing the old version of the task and adding the new one
+- Mean and variance of duration and delay (completion - deadline) are kept with Welford's method,
+  cells are merged with Chan's formula when the analysis is grouped by a single category
+- Same metrics as analyse.completion_metrics(), outliers are not counted
+- Quantile sketches of duration and delay (see sketches.py) are kept the same way, for the p50/p90/p99 percentiles
+- Aggregates of many users are merged the same way, for reports over the whole database (see report.py)
+"""
+
+import math
+
+from sketches import Sketch, QUANTILES, bucket_keys
+from utils import lazy_import
+
+pd = lazy_import("pandas")
+
+# columns of the cell keys, in key order
+KEYS = ["Task Importance", "Task Type"]
+
+
+class Welford:
+    """
+    - Running count, mean and sum of squared differences from the mean (m2) of a series of values
+    """
+
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self, n=0, mean=0.0, m2=0.0):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def remove(self, x):
+        # the last value is removed exactly, so no rounding error is left behind
+        if self.n <= 1:
+            self.n, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+
+        delta = x - self.mean
+        self.mean -= delta / (self.n - 1)
+        self.n -= 1
+        self.m2 = max(self.m2 - delta * (x - self.mean), 0.0)
+
+    def merge(self, other):
+        """
+        - Returns the aggregate of both series of values
+        """
+
+        n = self.n + other.n
+
+        if n == 0:
+            return Welford()
+
+        delta = other.mean - self.mean
+
+        return Welford(n, self.mean + delta * other.n / n, self.m2 + other.m2 + delta * delta * self.n * other.n / n)
+
+    def std(self):
+        # sample standard deviation, 0 for a single value
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+
+class Cell:
+    """
+    - Aggregates of the non outlier tasks of a single (importance, type)
+    - Tasks are counted whatever their status, the other fields only cover completed tasks
+    - Without sketches (eg the many small cells of the trend rollups) the percentiles aren't kept
+    """
+
+    __slots__ = ("tasks", "completed", "on_time", "late", "expected", "early_time", "early_count", "late_time", "late_count", "duration", "delay", "duration_sketch", "delay_sketch")
+
+    def __init__(self, sketches=True):
+        self.tasks = 0
+        self.completed = 0
+        self.on_time = 0
+        self.late = 0
+        self.expected = 0.0
+        self.early_time = 0.0
+        self.early_count = 0
+        self.late_time = 0.0
+        self.late_count = 0
+        self.duration = Welford()
+        self.delay = Welford()
+        self.duration_sketch = Sketch() if sketches else None
+        self.delay_sketch = Sketch() if sketches else None
+
+    def apply(self, task, sign):
+        """
+        - Adds (sign 1) or removes (sign -1) a task, task is a row of the typed userdata
+        """
+
+        self.tasks += sign
+
+        if task["Status"] == "Ongoing":
+            return
+
+        start = task["Start Time"]
+        deadline = task["Deadline"]
+        completed_on = task["Completed On"]
+
+        duration = (completed_on - start).total_seconds()
+        delay = (completed_on - deadline).total_seconds()
+
+        # missing was late is counted as neither on-time nor late, but its time as early (same as completion_metrics)
+        was_late = task["Was Late"]
+        late = not pd.isna(was_late) and bool(was_late)
+
+        self.completed += sign
+        self.on_time += sign * (not pd.isna(was_late) and not late)
+        self.late += sign * late
+        self.expected += sign * (deadline - start).total_seconds()
+
+        if late:
+            self.late_time += sign * delay
+            self.late_count += sign
+        else:
+            self.early_time -= sign * delay
+            self.early_count += sign
+
+        if sign > 0:
+            self.duration.add(duration)
+            self.delay.add(delay)
+        else:
+            self.duration.remove(duration)
+            self.delay.remove(delay)
+
+        if self.duration_sketch is not None:
+            self.duration_sketch.add(duration, sign)
+            self.delay_sketch.add(delay, sign)
+
+    def merge(self, other):
+        """
+        - Returns a new cell with the aggregates of both cells
+        """
+
+        # percentiles are only kept if both cells have them
+        sketches = self.duration_sketch is not None and other.duration_sketch is not None
+        cell = Cell(sketches=False)
+
+        for field in ["tasks", "completed", "on_time", "late", "expected", "early_time", "early_count", "late_time", "late_count"]:
+            setattr(cell, field, getattr(self, field) + getattr(other, field))
+
+        cell.duration = self.duration.merge(other.duration)
+        cell.delay = self.delay.merge(other.delay)
+
+        if sketches:
+            cell.duration_sketch = self.duration_sketch.merge(other.duration_sketch)
+            cell.delay_sketch = self.delay_sketch.merge(other.delay_sketch)
+
+        return cell
+
+    def metrics(self):
+        """
+        - Returns the metrics of the cell in the same layout as a row of completion_metrics()
+        """
+
+        return {
+            "Completed Tasks": self.completed,
+            "On-Time Tasks": self.on_time,
+            "Late Tasks": self.late,
+            "Std": self.delay.std(),
+            "Average Duration": self.duration.mean,
+            "Average Expected Duration": self.expected / self.completed,
+            "Average Early Completion": self.early_time / self.early_count if self.early_count else 0.0,
+            "Average Late Completion": self.late_time / self.late_count if self.late_count else 0.0,
+        }
+
+    def percentiles(self):
+        """
+        - Returns the p50/p90/p99 of the delay and duration of the completed tasks (in seconds) as a dict
+        """
+
+        percentiles = {}
+
+        for name, sketch in [("Delay", self.delay_sketch), ("Duration", self.duration_sketch)]:
+            for q, value in zip(QUANTILES, sketch.quantiles()):
+                percentiles[f"{name} p{round(q * 100)}"] = value
+
+        return percentiles
+
+
+def fill_cells(cells, completed, keys, sketches=True):
+    """
+    - Sets the completed task fields of the cells from the completed tasks, grouped by keys (series or columns of completed)
+    - All the cells are computed in one vectorized pass, cells of new keys are created (their number of tasks is left to the caller)
+    - Quantile sketches are filled as well, unless sketches is False
+    """
+
+    if len(completed) == 0:
+        return
+
+    delay = (completed["Completed On"] - completed["Deadline"]).dt.total_seconds()
+    late = completed["Was Late"].fillna(False).astype(bool)
+
+    frame = pd.DataFrame({
+        "Duration": (completed["Completed On"] - completed["Start Time"]).dt.total_seconds(),
+        "Expected": (completed["Deadline"] - completed["Start Time"]).dt.total_seconds(),
+        "Delay": delay,
+        "On-Time": ~completed["Was Late"].fillna(True).astype(bool),
+        "Late": late,
+        "Early Time": (-delay).where(~late),
+        "Late Time": delay.where(late),
+    })
+
+    grouped = frame.groupby(keys, sort=False, observed=True).agg(
+        completed=("Delay", "size"),
+        on_time=("On-Time", "sum"),
+        late=("Late", "sum"),
+        expected=("Expected", "sum"),
+        early_time=("Early Time", "sum"),
+        early_count=("Early Time", "count"),
+        late_time=("Late Time", "sum"),
+        late_count=("Late Time", "count"),
+        duration_mean=("Duration", "mean"),
+        duration_var=("Duration", "var"),
+        delay_mean=("Delay", "mean"),
+        delay_var=("Delay", "var"),
+    )
+
+    for key, row in zip(grouped.index, grouped.itertuples(index=False)):
+        cell = cells.setdefault(key, Cell(sketches))
+
+        cell.completed = int(row.completed)
+        cell.on_time = int(row.on_time)
+        cell.late = int(row.late)
+        cell.expected = float(row.expected)
+        cell.early_time = float(row.early_time)
+        cell.early_count = int(row.early_count)
+        cell.late_time = float(row.late_time)
+        cell.late_count = int(row.late_count)
+
+        # variance of a single value is nan, its m2 is 0
+        cell.duration = Welford(cell.completed, float(row.duration_mean), float(row.duration_var) * (cell.completed - 1) if cell.completed > 1 else 0.0)
+        cell.delay = Welford(cell.completed, float(row.delay_mean), float(row.delay_var) * (cell.completed - 1) if cell.completed > 1 else 0.0)
+
+    if not sketches:
+        return
+
+    # number of tasks of every (key, bucket), so sketches are filled a bucket at a time instead of a task at a time
+    for name, values in [("duration_sketch", frame["Duration"]), ("delay_sketch", frame["Delay"])]:
+        buckets = pd.Series(bucket_keys(values.to_numpy()), index=frame.index)
+
+        for key, count in buckets.groupby(list(keys) + [buckets], sort=False, observed=True).size().items():
+            cell = cells[key[:-1] if len(keys) > 1 else key[0]]
+            getattr(cell, name).add_counts([key[-1]], [int(count)])
+
+
+class Aggregates:
+
+    def __init__(self, userdata=None):
+        """
+        - Builds the cells from the typed userdata in one vectorized pass
+        - Without userdata the aggregates are empty, eg to merge the aggregates of many users into
+        """
+
+        # (importance, type) : cell
+        self.cells = {}
+
+        # category column : {value : [number of tasks incl outliers, smallest task id]}, gives the order the values first appear in
+        self.categories = {column: {} for column in KEYS}
+
+        if userdata is None:
+            return
+
+        for column in KEYS:
+            grouped = pd.Series(userdata.index, index=userdata.index).groupby(userdata[column], sort=False, observed=True)
+            counts = grouped.size()
+
+            for value, count, first in zip(counts.index, counts, grouped.min()):
+                self.categories[column][value] = [int(count), int(first)]
+
+        data = userdata[userdata["Is Outlier"] != True]
+        keys = [data[column] for column in KEYS]
+
+        for key, count in data.groupby(keys, sort=False, observed=True).size().items():
+            self.cells[key] = Cell()
+            self.cells[key].tasks = int(count)
+
+        completed = data[data["Status"] != "Ongoing"]
+
+        fill_cells(self.cells, completed, [completed[column] for column in KEYS])
+
+    def add(self, taskid, task):
+        """
+        - Adds a task (row of the typed userdata) to the aggregates
+        """
+
+        for column in KEYS:
+            category = self.categories[column].setdefault(task[column], [0, taskid])
+            category[0] += 1
+
+            if category[1] is not None:
+                category[1] = min(category[1], taskid)
+
+        if task["Is Outlier"] == True:
+            return
+
+        key = tuple(task[column] for column in KEYS)
+        self.cells.setdefault(key, Cell()).apply(task, 1)
+
+    def remove(self, taskid, task):
+        """
+        - Removes a task (row of the typed userdata, as it was added) from the aggregates
+        """
+
+        for column in KEYS:
+            category = self.categories[column][task[column]]
+            category[0] -= 1
+
+            if category[0] == 0:
+                del self.categories[column][task[column]]
+
+            # the first task of the value was removed, the next one is only looked up when needed
+            elif category[1] == taskid:
+                category[1] = None
+
+        if task["Is Outlier"] == True:
+            return
+
+        key = tuple(task[column] for column in KEYS)
+        cell = self.cells[key]
+        cell.apply(task, -1)
+
+        if cell.tasks == 0:
+            del self.cells[key]
+
+    def update(self, taskid, before, after):
+        """
+        - Applies a change of a task, before/after are the rows of the task before and after the change (None if added/deleted)
+        """
+
+        if before is not None:
+            self.remove(taskid, before)
+
+        if after is not None:
+            self.add(taskid, after)
+
+    def merge(self, other, userdata=None):
+        """
+        - Adds the aggregates of other (eg of another user's tasks) into these aggregates, other is not changed
+        - userdata is other's typed userdata, only needed if other's tasks were changed since it was built
+        - Task ids of different users can't be compared, so values new to these aggregates are ordered after the known ones
+        """
+
+        for column in KEYS:
+            categories = self.categories[column]
+
+            for value in other.order(column, userdata):
+                # the position of the value is kept instead of a task id
+                category = categories.setdefault(value, [0, len(categories)])
+                category[0] += other.categories[column][value][0]
+
+        for key, cell in other.cells.items():
+            # merging makes a new cell, so other's cells are never changed by these aggregates
+            self.cells[key] = self.cells.get(key, Cell()).merge(cell)
+
+    def order(self, column, userdata):
+        """
+        - Returns the values of a category column in the order they first appear in the userdata (same as unique())
+        """
+
+        values = self.categories[column]
+
+        for value, category in values.items():
+            # only needed after the first task of the value was removed
+            if category[1] is None:
+                category[1] = int(userdata.index[userdata[column] == value].min())
+
+        return sorted(values, key=lambda value: values[value][1])
+
+    def grouped(self, by):
+        """
+        - Returns the cells grouped by the column(s) in by, as a dict of group key : cell
+        - Cells are merged when grouped by a single column
+        """
+
+        if not isinstance(by, str):
+            positions = [KEYS.index(column) for column in by]
+            return {tuple(key[i] for i in positions): cell for key, cell in self.cells.items()}
+
+        position = KEYS.index(by)
+        groups = {}
+
+        for key, cell in self.cells.items():
+            value = key[position]
+            groups[value] = groups[value].merge(cell) if value in groups else cell
+
+        return groups
+
+    def counts(self, by):
+        """
+        - Returns the number of non outlier tasks of each group as a dict (same as groupby(by).size())
+        """
+
+        return {key: cell.tasks for key, cell in self.grouped(by).items() if cell.tasks}
+
+    def percentiles(self, by):
+        """
+        - Returns the p50/p90/p99 of the delay and duration (in seconds) of each group with completed tasks, indexed like metrics()
+        """
+
+        groups = {key: {"Completed Tasks": cell.completed, **cell.percentiles()} for key, cell in self.grouped(by).items() if cell.completed}
+
+        percentiles = pd.DataFrame.from_dict(groups, orient="index", columns=["Completed Tasks"] + [f"{name} p{round(q * 100)}" for name in ["Delay", "Duration"] for q in QUANTILES])
+
+        if not isinstance(by, str):
+            percentiles.index = pd.MultiIndex.from_tuples(list(groups), names=by) if groups else pd.MultiIndex.from_tuples([], names=by)
+
+        return percentiles
+
+    def metrics(self, by):
+        """
+        - Returns the completion metrics of each group with completed tasks, same as completion_metrics(userdata, by)
+        """
+
+        groups = {key: cell.metrics() for key, cell in self.grouped(by).items() if cell.completed}
+
+        metrics = pd.DataFrame.from_dict(groups, orient="index", columns=["Completed Tasks", "On-Time Tasks", "Late Tasks", "Std", "Average Duration", "Average Expected Duration", "Average Early Completion", "Average Late Completion"])
+
+        if not isinstance(by, str):
+            metrics.index = pd.MultiIndex.from_tuples(list(groups), names=by) if groups else pd.MultiIndex.from_tuples([], names=by)
+
+        return metrics
@@ -3,21 +3,30 @@
 - Outlier tasks are ignored
 - Analyse asks user for task type and importance to analyse (select multiple)
 - Detailed analysis displays the analysis of each task+importance combination as well
+- Trend analysis displays the completed tasks per day, week or month (see trends.py)
+- Percentile analysis displays the p50/p90/p99 of the delay and duration per category (see sketches.py)
 - Asks user if they want to export the analysis to a json file
 """
 
-import pandas as pd
-from utils import consent
+from utils import consent, lazy_import
+from aggregates import Aggregates
 from datetime import timedelta
 
+# pandas is only imported once an analysis is actually run
+pd = lazy_import("pandas")
+
 
 class Analyse:
 
     def __init__(self, login_object):
         self.login_object = login_object
-        self.userdata = login_object.userdata
         self.userstats = login_object.userstats
 
+    @property
+    def userdata(self):
+        # userdata is read from the login object, so it's only built when an analysis is first run
+        return self.login_object.userdata
+
     def analyse(self):
         """
         - Asks user for task type + importance (multiple or 'all') to analyse
@@ -126,109 +135,8 @@ class Analyse:
                 if not esc:
                     break
 
-        # asked types and importances are added to the dict
-        asked_combo = {"Task Importance": ask_imp, "Task Type": ask_type}
-
-        # copy is made of centralised userdata
-        # outliers are dropped
-        userdata = self.userdata.copy()
-        userdata.drop(userdata[userdata["Is Outlier"] == True].index, inplace=True)
-
-        data = pd.DataFrame(columns=["Category", "Field", "Parameter", "Value"])
-
-        # the for loop gives the task_category : asked_values (eg: cattitle - task importance, catvalues - [medium,hard])
-        for index, (cattitle, catvalues) in enumerate(asked_combo.items()):
-
-            # this for loop picks value from the catvalues (eg : value - medium)
-            for value in catvalues:
-
-                duration = 0
-                exp_duration = 0
-                early = 0
-                late = 0
-                no_early = 0
-                no_late = 0
-                std_dev_list = []
-
-                # userdata where only rows where cattitle = value is there
-                filtered_userdata = userdata[userdata[cattitle] == value]
-                # filtered userdata where tasks are completed
-                completed_filtered_userdata = filtered_userdata[filtered_userdata["Completed On"] != "Ongoing"]
-
-                # length of completed filtered userdata is checked to prevent errors due to zero tasks found
-                if len(completed_filtered_userdata) > 0:
-
-                    # iterates row index in completed filtered userdata
-                    for index in completed_filtered_userdata.index:
-
-                        delta = (completed_filtered_userdata.loc[index, "Completed On"] - completed_filtered_userdata.loc[index, "Start Time"])
-                        exp_delta = (completed_filtered_userdata.loc[index, "Deadline"] - completed_filtered_userdata.loc[index, "Start Time"])
-
-                        duration += delta.total_seconds()
-                        exp_duration += exp_delta.total_seconds()
-
-                        was_late = completed_filtered_userdata.loc[index, "Was Late"]
-
-                        comp_dead_delta = (completed_filtered_userdata.loc[index, "Completed On"] - completed_filtered_userdata.loc[index, "Deadline"]).total_seconds()
-                        std_dev_list.append(comp_dead_delta)
-
-                        if was_late:
-                            no_late += 1
-                            late += comp_dead_delta
-                        else:
-                            no_early += 1
-                            early -= comp_dead_delta
-
-                    avg_duration = timedelta(seconds=(duration / len(completed_filtered_userdata)))
-                    avg_exp_duration = timedelta(seconds=(exp_duration / len(completed_filtered_userdata)))
-
-                    # try except is used to prevent errors due to zero such tasks
-                    try:
-                        avg_late = timedelta(seconds=late / no_late)
-                    except:
-                        avg_late = timedelta(seconds=0)
-
-                    try:
-                        avg_early = timedelta(seconds=early / no_early)
-                    except:
-                        avg_early = timedelta(seconds=0)
-
-                    # since std dev cannot run on only one value
-                    if len(std_dev_list) > 1:
-                        std_dev = timedelta(seconds=(pd.Series(std_dev_list).std()))
-                        std_dev -= timedelta(microseconds=std_dev.microseconds)
-                    else:
-                        std_dev = timedelta(seconds=0)
-
-                    # helps assignment of the opposite category and its values (all unique not asked)
-                    # helps in calculation of no of tasks of each asked category + opposite category values
-                    if cattitle == "Task Importance":
-                        cat = "Task Type"
-                        catvals = category_tasks
-
-                    else:
-                        cat = "Task Importance"
-                        catvals = category_importance
-
-                    # adds an empty row for visual purposes
-                    data.loc[len(data), :] = ["", "", "", ""]
-                    data.loc[len(data), :] = [cattitle, value, "No. of Tasks", len(filtered_userdata)]
-
-                    # number of tasks which match current type + value and opposite type + value
-                    # eg if current cattitle is task type, value is work, then cat = task importance, catvals = [medium,hard], q will be medium
-                    for q in catvals:
-                        data.loc[len(data), :] = [cattitle, value, f"No of {q} Tasks", len(filtered_userdata[filtered_userdata[cat] == q])]
-
-                    on_time = len(
-                        completed_filtered_userdata[completed_filtered_userdata["Was Late"] == False])
-                    data.loc[len(data), :] = [cattitle, value, "On-Time Tasks", on_time]
-                    data.loc[len(data), :] = [cattitle, value, "Late Tasks", len(completed_filtered_userdata[completed_filtered_userdata["Was Late"] == True])]
-                    data.loc[len(data), :] = [cattitle, value, "On-Time (%)", on_time * 100 / len(completed_filtered_userdata)]
-                    data.loc[len(data), :] = [cattitle, value, "Consistency (Std)", std_dev]
-                    data.loc[len(data), :] = [cattitle, value, "Average Duration", avg_duration]
-                    data.loc[len(data), :] = [cattitle, value, "Average Expected Duration", avg_exp_duration]
-                    data.loc[len(data), :] = [cattitle, value, "Average Early Completion", avg_early]
-                    data.loc[len(data), :] = [cattitle, value, "Average Late Completion", avg_late]
+        # analysis is only computed again if the tasks changed since the same analysis was last run
+        data = self.login_object.cached(("analyse", tuple(ask_imp), tuple(ask_type)), lambda: analyse(self.userdata, ask_imp, ask_type, self.login_object.aggregates))
 
         print(data)
 
@@ -245,109 +153,342 @@ class Analyse:
         - Except, here the analysis is done for all type + importance combinations in the database instead
         """
 
-        category_importance = self.userdata["Task Importance"].unique()
-        category_tasks = self.userdata["Task Type"].unique()
-        category_combo = {"Task Importance": category_importance, "Task Type": category_tasks}
+        data = self.login_object.cached(("detailed",), lambda: detailed_analysis(self.userdata, self.login_object.aggregates))
+
+        print(data)
+
+        # asks user if they want to export analysis to external json file
+        print("\nDo you want to export this data to an external json file?")
+        ask = consent()
+
+        if ask:
+            self.login_object.custom_export(data)
+
+    def trend_analysis(self):
+        """
+        - Asks user for the period (daily, weekly or monthly) and what to split the trend by (importance, type, both or none)
+        - Trend is read from the rollups of the login object, which are kept up to date as tasks change
+        """
+
+        periods = {"1": "daily", "2": "weekly", "3": "monthly"}
+        groups = {"1": "none", "2": "importance", "3": "type", "4": "both"}
+
+        print("\nTrend of the completed tasks per :")
+        print("\n 1. Day \n 2. Week \n 3. Month")
+
+        while True:
+            ask_period = input("Enter the code of the period : ").strip()
+
+            if ask_period not in periods:
+                print("\nEnter a valid period code")
+
+            else:
+                break
+
+        print("\nSplit the trend by :")
+        print("\n 1. Nothing (all tasks) \n 2. Task Importance \n 3. Task Type \n 4. Both")
+
+        while True:
+            ask_group = input("Enter the code of the split : ").strip()
+
+            if ask_group not in groups:
+                print("\nEnter a valid split code")
 
-        userdata = self.userdata.copy()
-        userdata.drop(userdata[userdata["Is Outlier"] == True].index, inplace=True)
+            else:
+                break
+
+        period = periods[ask_period]
+        by = groups[ask_group]
+
+        data = self.login_object.cached(("trend", period, by), lambda: self.login_object.trends.trend(period, by))
+
+        print(data)
+
+        # asks user if they want to export the trend to an external json file
+        print("\nDo you want to export this data to an external json file?")
+        ask = consent()
+
+        if ask:
+            self.login_object.custom_export(data)
+
+    def percentile_analysis(self):
+        """
+        - Asks user what to split the percentiles by (importance, type or both)
+        - Percentiles are read from the quantile sketches of the running aggregates
+        """
+
+        groups = {"1": "Task Importance", "2": "Task Type", "3": ["Task Importance", "Task Type"]}
 
-        data = pd.DataFrame(columns=["Category", "Primary Field", "Secondary Field", "Parameter", "Value"])
+        print("\nPercentiles of delay and duration per :")
+        print("\n 1. Task Importance \n 2. Task Type \n 3. Both")
 
-        # the for loop gives the task_category : asked_values (eg: cattitle - task importance, catvalues - [medium,hard])
-        for index, (cattitle, catvalues) in enumerate(category_combo.items()):
+        while True:
+            ask_group = input("Enter the code of the category : ").strip()
+
+            if ask_group not in groups:
+                print("\nEnter a valid category code")
 
-            # helps in setting in opposite/secondary category
-            if index == 0:
-                seccat = "Task Type"
             else:
-                seccat = "Task Importance"
-
-            # this for loop picks value from the catvalues (eg : value - medium)
-            for value in catvalues:
-
-                # this loop chooses a value from the secondary category values (eg medium from [easy,medium,hard])
-                for seccatvalue in category_combo[seccat]:
-
-                    duration = 0
-                    exp_duration = 0
-                    early = 0
-                    late = 0
-                    no_early = 0
-                    no_late = 0
-                    std_dev_list = []
-
-                    # userdata where only rows which match both primary and secondary categories' chosen (by the loop) values
-                    filtered_userdata = userdata[userdata[cattitle] == value]
-                    filtered_userdata = filtered_userdata[filtered_userdata[seccat] == seccatvalue]
-                    # filtered data where only completed tasks are present
-                    completed_filtered_userdata = filtered_userdata[filtered_userdata["Completed On"] != "Ongoing"]
-
-                    # to prevent any errors if zero such tasks are found
-                    if len(completed_filtered_userdata) > 0:
-
-                        # iterates over the row index in completed filtered data
-                        for index in completed_filtered_userdata.index:
-
-                            delta = (completed_filtered_userdata.loc[index, "Completed On"] - completed_filtered_userdata.loc[index, "Start Time"])
-                            exp_delta = (completed_filtered_userdata.loc[index, "Deadline"] - completed_filtered_userdata.loc[index, "Start Time"])
-
-                            duration += delta.total_seconds()
-                            exp_duration += exp_delta.total_seconds()
-
-                            was_late = completed_filtered_userdata.loc[index, "Was Late"]
-
-                            comp_dead_delta = (completed_filtered_userdata.loc[index, "Completed On"] - completed_filtered_userdata.loc[index, "Deadline"]).total_seconds()
-                            std_dev_list.append(comp_dead_delta)
-
-                            if was_late:
-                                no_late += 1
-                                late += comp_dead_delta
-                            else:
-                                no_early += 1
-                                early -= comp_dead_delta
-
-                        avg_duration = timedelta(seconds=(duration / len(completed_filtered_userdata)))
-                        avg_exp_duration = timedelta(seconds=(exp_duration / len(completed_filtered_userdata)))
-
-                        # try except is used to prevent errors due to zero such tasks
-                        try:
-                            avg_late = timedelta(seconds=late / no_late)
-                        except:
-                            avg_late = timedelta(seconds=0)
-
-                        try:
-                            avg_early = timedelta(seconds=early / no_early)
-                        except:
-                            avg_early = timedelta(seconds=0)
-
-                        # since std dev cannot run on only one value
-                        if len(std_dev_list) > 1:
-                            std_dev = timedelta(seconds=(pd.Series(std_dev_list).std()))
-                            std_dev -= timedelta(microseconds=std_dev.microseconds)
-                        else:
-                            std_dev = timedelta(seconds=0)
-
-                        # adds an empty row for visual purposes
-                        data.loc[len(data), :] = ["", "", "", "", ""]
-                        data.loc[len(data), :] = [cattitle, value, seccatvalue, "No. of Tasks", len(filtered_userdata)]
-
-                        on_time = len(completed_filtered_userdata[completed_filtered_userdata["Was Late"] == False])
-
-                        data.loc[len(data), :] = [cattitle, value, seccatvalue, "On-Time Tasks", on_time]
-                        data.loc[len(data), :] = [cattitle, value, seccatvalue, "Late Tasks", len(completed_filtered_userdata[completed_filtered_userdata["Was Late"] == True])]
-                        data.loc[len(data), :] = [cattitle, value, seccatvalue, "On-Time (%)", on_time * 100 / len(completed_filtered_userdata)]
-                        data.loc[len(data), :] = [cattitle, value, seccatvalue, "Consistency (Std)", std_dev]
-                        data.loc[len(data), :] = [cattitle, value, seccatvalue, "Average Duration", avg_duration]
-                        data.loc[len(data), :] = [cattitle, value, seccatvalue, "Average Expected Duration", avg_exp_duration]
-                        data.loc[len(data), :] = [cattitle, value, seccatvalue, "Average Early Completion", avg_early,]
-                        data.loc[len(data), :] = [cattitle, value, seccatvalue, "Average Late Completion", avg_late]
+                break
+
+        data = self.login_object.cached(("percentiles", ask_group), lambda: percentile_analysis(self.userdata, groups[ask_group], self.login_object.aggregates))
 
         print(data)
 
-        # asks user if they want to export analysis to external json file
+        # asks user if they want to export the percentiles to an external json file
         print("\nDo you want to export this data to an external json file?")
         ask = consent()
 
         if ask:
             self.login_object.custom_export(data)
+
+
+def analyse(userdata, importances=(), types=(), aggregates=None, masks=None):
+    """
+    - Returns the analysis of the given task importances and types as a dataframe, without asking or printing anything
+    - importances and types can be lists of values or 'all', an empty list skips that category
+    - Same fields as Analyse.analyse(), values with zero completed tasks are skipped
+    - If the running aggregates of the userdata are given, the metrics are read from them instead of the tasks
+    - Otherwise outliers are dropped with the outlier mask if the masks of the userdata are given
+    """
+
+    # adds unique types and importance to lists
+    if aggregates is not None:
+        category_importance = aggregates.order("Task Importance", userdata)
+        category_tasks = aggregates.order("Task Type", userdata)
+
+    else:
+        category_importance = userdata["Task Importance"].unique()
+        category_tasks = userdata["Task Type"].unique()
+
+    if isinstance(importances, str) and importances == "all":
+        importances = category_importance
+
+    if isinstance(types, str) and types == "all":
+        types = category_tasks
+
+    # asked types and importances are added to the dict
+    asked_combo = {"Task Importance": importances, "Task Type": types}
+
+    # outliers are dropped, centralised userdata is not changed
+    if aggregates is None:
+        userdata = drop_outliers(userdata, masks)
+
+    # rows of the output are collected in a list and the dataframe is built once at the end
+    rows = []
+
+    # the for loop gives the task_category : asked_values (eg: cattitle - task importance, catvalues - [medium,hard])
+    for cattitle, catvalues in asked_combo.items():
+
+        # helps assignment of the opposite category and its values (all unique not asked)
+        # helps in calculation of no of tasks of each asked category + opposite category values
+        if cattitle == "Task Importance":
+            cat = "Task Type"
+            catvals = category_tasks
+
+        else:
+            cat = "Task Importance"
+            catvals = category_importance
+
+        # metrics of all values of the category are computed in a single pass
+        if aggregates is not None:
+            metrics = aggregates.metrics(cattitle)
+            counts = aggregates.counts(cattitle)
+            cross_counts = aggregates.counts([cattitle, cat])
+
+        else:
+            metrics = completion_metrics(userdata, cattitle)
+            counts = userdata.groupby(cattitle, observed=True).size()
+            cross_counts = userdata.groupby([cattitle, cat], observed=True).size()
+
+        # this for loop picks value from the catvalues (eg : value - medium)
+        for value in catvalues:
+
+            # values with zero completed tasks are skipped
+            if value not in metrics.index:
+                continue
+
+            row = metrics.loc[value]
+
+            # adds an empty row for visual purposes
+            rows.append(["", "", "", ""])
+            rows.append([cattitle, value, "No. of Tasks", int(counts.get(value, 0))])
+
+            # number of tasks which match current type + value and opposite type + value
+            # eg if current cattitle is task type, value is work, then cat = task importance, catvals = [medium,hard], q will be medium
+            for q in catvals:
+                rows.append([cattitle, value, f"No of {q} Tasks", int(cross_counts.get((value, q), 0))])
+
+            rows.extend([cattitle, value, parameter, metric] for parameter, metric in metric_rows(row))
+
+    data = pd.DataFrame(rows, columns=["Category", "Field", "Parameter", "Value"], dtype=object)
+
+    return data
+
+
+def detailed_analysis(userdata, aggregates=None, masks=None):
+    """
+    - Returns the analysis of every type + importance combination as a dataframe, without asking or printing anything
+    - If the running aggregates of the userdata are given, the metrics are read from them instead of the tasks
+    - Otherwise outliers are dropped with the outlier mask if the masks of the userdata are given
+    """
+
+    if aggregates is not None:
+        category_importance = aggregates.order("Task Importance", userdata)
+        category_tasks = aggregates.order("Task Type", userdata)
+
+        # metrics and task counts of every importance + type combination are read from the cells
+        metrics = aggregates.metrics(["Task Importance", "Task Type"])
+        counts = aggregates.counts(["Task Importance", "Task Type"])
+
+    else:
+        category_importance = userdata["Task Importance"].unique()
+        category_tasks = userdata["Task Type"].unique()
+
+        userdata = drop_outliers(userdata, masks)
+
+        # metrics and task counts of every importance + type combination are computed once
+        metrics = completion_metrics(userdata, ["Task Importance", "Task Type"])
+        counts = userdata.groupby(["Task Importance", "Task Type"], observed=True).size()
+
+    category_combo = {"Task Importance": category_importance, "Task Type": category_tasks}
+    cells = {key: metric_rows(row) for key, row in metrics.iterrows()}
+
+    rows = []
+
+    # the for loop gives the task_category : asked_values (eg: cattitle - task importance, catvalues - [medium,hard])
+    for index, (cattitle, catvalues) in enumerate(category_combo.items()):
+
+        # helps in setting in opposite/secondary category
+        if index == 0:
+            seccat = "Task Type"
+        else:
+            seccat = "Task Importance"
+
+        # this for loop picks value from the catvalues (eg : value - medium)
+        for value in catvalues:
+
+            # this loop chooses a value from the secondary category values (eg medium from [easy,medium,hard])
+            for seccatvalue in category_combo[seccat]:
+
+                # both layouts read the same cell, keyed by (importance, type)
+                key = (value, seccatvalue) if index == 0 else (seccatvalue, value)
+
+                # combinations with zero completed tasks are skipped
+                if key not in cells:
+                    continue
+
+                # adds an empty row for visual purposes
+                rows.append(["", "", "", "", ""])
+                rows.append([cattitle, value, seccatvalue, "No. of Tasks", int(counts[key])])
+
+                rows.extend([cattitle, value, seccatvalue, parameter, metric] for parameter, metric in cells[key])
+
+    data = pd.DataFrame(rows, columns=["Category", "Primary Field", "Secondary Field", "Parameter", "Value"], dtype=object)
+
+    return data
+
+
+def percentile_analysis(userdata, by="Task Importance", aggregates=None):
+    """
+    - Returns the p50/p90/p99 of the delay (completion - deadline, negative if early) and duration of the completed tasks
+      of every value of by (a column or a list of columns) as a dataframe, in hours, outliers are ignored
+    - Read from the quantile sketches of the running aggregates (built from the userdata if not given), within 1% of the exact values
+    """
+
+    if aggregates is None:
+        aggregates = Aggregates(userdata)
+
+    data = aggregates.percentiles(by)
+
+    # values are shown in the order they first appear, same as the analysis
+    if isinstance(by, str):
+        data = data.reindex([value for value in aggregates.order(by, userdata) if value in data.index])
+
+    else:
+        positions = [{value: i for i, value in enumerate(aggregates.order(column, userdata))} for column in by]
+        data = data.iloc[sorted(range(len(data)), key=lambda row: [position[value] for position, value in zip(positions, data.index[row])])]
+
+    seconds = list(data.columns[1:])
+    data[seconds] = data[seconds] / 3600
+
+    return data.rename(columns={column: f"{column} (h)" for column in seconds}).rename_axis(by).reset_index()
+
+
+def drop_outliers(userdata, masks=None):
+    """
+    - Returns the tasks of userdata which aren't outliers (a new dataframe, userdata is not changed)
+    """
+
+    if masks is not None:
+        return userdata[~masks.get("Is Outlier", True)]
+
+    return userdata[userdata["Is Outlier"] != True]
+
+
+def completion_metrics(userdata, by):
+    """
+    - Computes the completion metrics of the completed tasks in userdata, grouped by the column(s) in by
+    - All groups are computed in one vectorized pass instead of iterating over the rows of each group
+    - Returns a dataframe indexed by the group values, groups with zero completed tasks are not present
+    - Durations are returned in seconds, std is 0 for groups with a single task
+    """
+
+    completed = userdata[userdata["Status"] != "Ongoing"]
+
+    completed_on = completed["Completed On"]
+    start_time = completed["Start Time"]
+    deadline = completed["Deadline"]
+
+    # difference between completion and deadline, positive if the task was completed late
+    delay = (completed_on - deadline).dt.total_seconds()
+    was_late = completed["Was Late"].fillna(False).astype(bool)
+
+    frame = pd.DataFrame({
+        "Duration": (completed_on - start_time).dt.total_seconds(),
+        "Expected Duration": (deadline - start_time).dt.total_seconds(),
+        "Delay": delay,
+        "On-Time": ~completed["Was Late"].fillna(True).astype(bool),
+        "Late": was_late,
+        # early and late times are only kept for the tasks they apply to, so their mean skips the rest
+        "Early Time": (-delay).where(~was_late),
+        "Late Time": delay.where(was_late),
+    })
+
+    # only the categories which have completed tasks are kept
+    metrics = frame.groupby([completed[column] for column in ([by] if isinstance(by, str) else by)], observed=True).agg(
+        **{
+            "Completed Tasks": ("Delay", "size"),
+            "On-Time Tasks": ("On-Time", "sum"),
+            "Late Tasks": ("Late", "sum"),
+            "Std": ("Delay", "std"),
+            "Average Duration": ("Duration", "mean"),
+            "Average Expected Duration": ("Expected Duration", "mean"),
+            "Average Early Completion": ("Early Time", "mean"),
+            "Average Late Completion": ("Late Time", "mean"),
+        }
+    )
+
+    # std of a single task and averages over zero early/late tasks are set to 0
+    return metrics.fillna(0)
+
+
+def metric_rows(row):
+    """
+    - Converts a row of completion_metrics() into (parameter, value) pairs shown in the analysis
+    - Durations are converted into timedelta objects, std is truncated to whole seconds
+    """
+
+    std_dev = timedelta(seconds=row["Std"])
+    std_dev -= timedelta(microseconds=std_dev.microseconds)
+
+    return [
+        ("On-Time Tasks", int(row["On-Time Tasks"])),
+        ("Late Tasks", int(row["Late Tasks"])),
+        ("On-Time (%)", float(row["On-Time Tasks"] * 100 / row["Completed Tasks"])),
+        ("Consistency (Std)", std_dev),
+        ("Average Duration", timedelta(seconds=row["Average Duration"])),
+        ("Average Expected Duration", timedelta(seconds=row["Average Expected Duration"])),
+        ("Average Early Completion", timedelta(seconds=row["Average Early Completion"])),
+        ("Average Late Completion", timedelta(seconds=row["Average Late Completion"])),
+    ]
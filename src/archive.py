@@ -0,0 +1,89 @@
+"""
+- Analysis of task archives too big to be loaded at once (eg years of exports of many users), same output as analyse/detailed_analysis
+- Archives are read a chunk of rows at a time (ndjson, csv or parquet), every chunk is validated and parsed like an import
+- Each chunk is folded into running aggregates (counts, sums, mean and m2 per cell) which are merged, so memory use stays bounded
+- Parquet needs pyarrow, which is optional
+"""
+
+from aggregates import Aggregates
+from exporter import CHUNK_SIZE
+from importer import parse_tasks
+from report import analysis
+from utils import lazy_import
+
+pd = lazy_import("pandas")
+
+
+def read_chunks(path, size=CHUNK_SIZE):
+    """
+    - Yields the rows of an ndjson, csv or parquet file as dataframes of up to size rows, fields as they are in the file
+    - Raises ValueError for other files, OSError if the file can't be read and ImportError for parquet without pyarrow
+    """
+
+    lower = path.lower()
+
+    if lower.endswith((".ndjson", ".jsonl")):
+        with pd.read_json(path, lines=True, dtype=False, convert_dates=False, chunksize=size) as reader:
+            yield from reader
+
+    elif lower.endswith(".csv"):
+        with pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=size) as reader:
+            yield from reader
+
+    elif lower.endswith(".parquet"):
+        try:
+            import pyarrow.parquet
+
+        except ImportError:
+            raise ImportError("Parquet archives need pyarrow (pip install pyarrow)")
+
+        # row groups are read a batch at a time, not the whole file
+        for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=size):
+            yield batch.to_pandas()
+
+    else:
+        raise ValueError("Only .ndjson, .csv and .parquet archives can be analysed")
+
+
+def fold(paths, aggregates=None):
+    """
+    - Folds the tasks of the archives at paths into aggregates (new ones if not given), returns (aggregates, number of tasks)
+    - Raises ValueError listing the invalid rows of the first chunk which has any
+    """
+
+    if aggregates is None:
+        aggregates = Aggregates()
+
+    tasks = 0
+
+    for path in paths:
+        rows = 0
+
+        for raw in read_chunks(path):
+            # an empty csv still gives a chunk (of no rows)
+            if len(raw) == 0:
+                continue
+
+            # tasks get ids in the order they are read, so values are ordered by their first appearance
+            chunk, errors = parse_tasks(raw, tasks + 1, rows + 1)
+
+            if errors:
+                raise ValueError(f"{path} could not be analysed :\n" + "\n".join(f" - {error}" for error in errors))
+
+            aggregates.merge(Aggregates(chunk))
+
+            rows += len(raw)
+            tasks += len(raw)
+
+    return aggregates, tasks
+
+
+def analyse_archives(paths, detailed=False):
+    """
+    - Returns the analysis of every importance and type (or every combination if detailed) of the tasks of the archives
+    - Only a chunk of tasks is in memory at a time
+    """
+
+    aggregates, _ = fold(paths)
+
+    return analysis(None, aggregates, detailed)
@@ -0,0 +1,423 @@
+"""
+- Batch (scripted) mode of the task analyzer, used when main.py is given command line arguments
+- Runs one or many commands for one, many or all users in a single process, without the menu or any prompts
+- Commands are seperated by '+', eg : main.py --user alex_walker analyse --type Work,Study --export out.json + detailed
+- Data is read directly from the database (like storage.py migrate), no password is asked
+- Outputs are printed, or written to json with --export ({user} in the path is replaced with the username)
+- report and archive are run once over all the selected users instead of for every user, at their place in the commands
+"""
+
+import argparse
+import json
+import sys
+from datetime import datetime
+from itertools import groupby
+
+from login import Login, USERS_FILE, BACKEND, load_userdata, memory_report
+from exporter import FORMATS, export_frame
+from storage import SQLiteStorage, VIEWS
+from users import UsersRegistry
+from tasks import query, quick_view, overdue_tasks, due_tasks, taskcategories, importancecategories
+from analyse import analyse, detailed_analysis, percentile_analysis
+from importer import read_tasks, parse_tasks
+from report import run_report
+from archive import analyse_archives
+from trends import PERIODS, GROUPS
+from instrument import phase
+
+# columns the percentiles can be split by
+PERCENTILE_GROUPS = {"importance": "Task Importance", "type": "Task Type", "both": ["Task Importance", "Task Type"]}
+
+# commands run once over all the selected users
+ONCE = ["report", "archive"]
+
+# fields tasks can be sorted by
+SORT_FIELDS = ["Task Type", "Task Importance", "Start Time", "Deadline", "Completed On", "Task Name"]
+
+
+def categories(valid):
+    """
+    - Returns an argument type converting a comma seperated list of categories into a list, 'all' is kept as is
+    - Every category has to be one of valid
+    """
+
+    def convert(value):
+
+        if value.strip().lower() == "all":
+            return "all"
+
+        # duplicates are dropped, order is kept
+        value = list(dict.fromkeys(j.strip().title() for j in value.split(",") if j.strip()))
+
+        for j in value:
+            if j not in valid:
+                raise argparse.ArgumentTypeError(f"{j} is not a valid category")
+
+        return value
+
+    return convert
+
+
+def sorters(value):
+    """
+    - Converts a comma seperated list of field:asc/dsc into (field, ascending) pairs, eg 'deadline:asc,task name:dsc'
+    """
+
+    pairs = []
+
+    for sorter in value.split(","):
+        field, _, order = sorter.partition(":")
+        field = field.strip().title()
+        order = order.strip().lower() or "asc"
+
+        if field not in SORT_FIELDS or order not in ["asc", "dsc"]:
+            raise argparse.ArgumentTypeError(f"{sorter.strip()} is not a valid sorter")
+
+        pairs.append((field, order == "asc"))
+
+    return pairs
+
+
+def date(value):
+    """
+    - Converts a date (YYYY-MM-DD) argument into a datetime
+    """
+
+    try:
+        return datetime.strptime(value.strip(), "%Y-%m-%d")
+
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value} is not a valid date (YYYY-MM-DD)")
+
+
+def build_parsers():
+    """
+    - Returns the parser of the global options and the parser of a single command
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="main.py",
+        description="Runs task analyzer commands without the interactive menu. Without any arguments the menu is started.",
+        epilog="Commands are seperated by '+', eg : main.py --user alex_walker analyse --type Work,Study --export out.json + detailed",
+    )
+    users = parser.add_mutually_exclusive_group(required=True)
+    users.add_argument("--user", help="comma seperated usernames to run the commands for")
+    users.add_argument("--all-users", action="store_true", help="run the commands for every user")
+
+    commands = argparse.ArgumentParser(prog="main.py --user USER")
+    subparsers = commands.add_subparsers(dest="command", required=True, metavar="command")
+
+    profile = subparsers.add_parser("profile", help="user stats")
+
+    quick = subparsers.add_parser("quick-view", help="all tasks, sorted the quick view way")
+
+    view = subparsers.add_parser("view", help="filtered and sorted tasks")
+    view.add_argument("--importance", type=categories(importancecategories), default="all", help="comma seperated importances or 'all'")
+    view.add_argument("--type", type=categories(taskcategories), default="all", help="comma seperated task types or 'all'")
+    view.add_argument("--sort", type=sorters, default=[], help="comma seperated field:asc/dsc, eg deadline:asc,task name:dsc")
+    view.add_argument("--view", choices=list(VIEWS), default="all", help="status of the tasks to keep")
+
+    analysis = subparsers.add_parser("analyse", help="analysis of the given importances and/or types (every importance and type if neither is given)")
+    analysis.add_argument("--importance", type=categories(importancecategories), help="comma seperated importances or 'all'")
+    analysis.add_argument("--type", type=categories(taskcategories), help="comma seperated task types or 'all'")
+
+    detailed = subparsers.add_parser("detailed", help="analysis of every type + importance combination")
+
+    memory = subparsers.add_parser("memory", help="memory used by the tasks, per column")
+
+    overdue = subparsers.add_parser("overdue", help="ongoing tasks past their deadline")
+
+    due = subparsers.add_parser("due", help="ongoing tasks due in the next hours")
+    due.add_argument("--hours", type=float, default=24, help="hours to look ahead (default 24)")
+
+    imports = subparsers.add_parser("import", help="add the tasks of a csv/ndjson file (nothing is added if any row is invalid)")
+    imports.add_argument("--file", required=True, help="csv or ndjson file of tasks ({user} is replaced with the username)")
+
+    percentiles = subparsers.add_parser("percentiles", help="p50/p90/p99 of delay and duration per category, read from quantile sketches")
+    percentiles.add_argument("--by", choices=list(PERCENTILE_GROUPS), default="importance", help="category to split the percentiles by (default importance)")
+
+    trend = subparsers.add_parser("trend", help="completed tasks per day, week or month, read from the trend rollups")
+    trend.add_argument("--period", choices=list(PERIODS), default="monthly", help="length of the buckets (default monthly)")
+    trend.add_argument("--by", choices=list(GROUPS), help="split every bucket by importance, type or both (default : the categories given below, else none)")
+    trend.add_argument("--importance", type=categories(importancecategories), help="comma seperated importances to keep or 'all'")
+    trend.add_argument("--type", type=categories(taskcategories), help="comma seperated task types to keep or 'all'")
+    trend.add_argument("--since", type=date, help="first bucket to keep, YYYY-MM-DD")
+    trend.add_argument("--until", type=date, help="last bucket to keep, YYYY-MM-DD")
+
+    report = subparsers.add_parser("report", help="profile and analysis of every selected user and of all of them together, run once for all the users")
+    report.add_argument("--workers", type=int, default=None, help="number of processes the users are analysed in (default : number of cores)")
+    report.add_argument("--detailed", action="store_true", help="analyse every type + importance combination")
+    report.add_argument("--percentiles", action="store_true", help="p50/p90/p99 of delay and duration instead of the analysis")
+
+    archive = subparsers.add_parser("archive", help="analysis of ndjson/csv/parquet archives read in chunks (bounded memory), run once for all the users")
+    archive.add_argument("--file", action="append", required=True, help="archive to analyse, can be given many times ({user} is replaced with every selected username)")
+    archive.add_argument("--detailed", action="store_true", help="analyse every type + importance combination")
+
+    for command in [profile, quick, view, analysis, detailed, percentiles, memory, overdue, due, trend, imports, report, archive]:
+        command.add_argument("--export", metavar="PATH", help="file to write the output to ({user} is replaced with the username)")
+        command.add_argument("--format", choices=[j.replace(" ", "-") for j in FORMATS], default="json", help="format of the exported file (profile is always json)")
+
+    return parser, commands
+
+
+def parse(argv):
+    """
+    - Returns the global options and the list of parsed commands
+    """
+
+    parser, commands = build_parsers()
+
+    options, rest = parser.parse_known_args(argv)
+
+    # splits the remaining arguments into commands at every '+'
+    chunks = [[]]
+    for arg in rest:
+        if arg == "+":
+            chunks.append([])
+        else:
+            chunks[-1].append(arg)
+
+    if not any(chunks):
+        parser.error("no command given")
+
+    return options, [commands.parse_args(chunk) for chunk in chunks if chunk]
+
+
+def asked_categories(command):
+    """
+    - Returns the importances and types asked by a command, only the categories whose option was given are analysed
+    - A category which wasn't given is an empty list (skipped), both are 'all' if neither was given
+    """
+
+    if command.importance is None and command.type is None:
+        return "all", "all"
+
+    return [[] if value is None else value for value in [command.importance, command.type]]
+
+
+def run_command(user, command):
+    """
+    - Runs a single command for a loaded user and returns its output dataframe
+    - profile returns the userstats dict instead, so it doesn't need the userdata (or pandas)
+    """
+
+    match command.command:
+
+        case "profile":
+            return user.userstats
+
+        case "quick-view":
+            return quick_view(user.userdata, user.orders)
+
+        case "view":
+            if user.storage is not None:
+                # the database query needs the actual categories instead of 'all', they are read from the database too
+                importances = user.categories("Task Importance") if command.importance == "all" else command.importance
+                types = user.categories("Task Type") if command.type == "all" else command.type
+
+                return load_userdata(user.storage.query(user.username, importances, types, command.sort, command.view))
+
+            return query(user.userdata, command.importance, command.type, command.sort, command.view, user.masks, user.orders)
+
+        case "analyse":
+            importances, types = asked_categories(command)
+
+            # 'all' is kept as is in the key, lists of categories are converted to tuples
+            key = ("analyse", *[j if j == "all" else tuple(j) for j in [importances, types]])
+
+            return user.cached(key, lambda: analyse(user.userdata, importances, types, user.aggregates))
+
+        case "detailed":
+            return user.cached(("detailed",), lambda: detailed_analysis(user.userdata, user.aggregates))
+
+        case "percentiles":
+            return user.cached(("percentiles", command.by), lambda: percentile_analysis(user.userdata, PERCENTILE_GROUPS[command.by], user.aggregates))
+
+        case "memory":
+            return memory_report(user.userdata)
+
+        case "trend":
+            # categories which weren't given aren't filtered
+            importances = "all" if command.importance is None else command.importance
+            types = "all" if command.type is None else command.type
+
+            # without --by, every bucket is split by the categories which were given
+            by = command.by or {(False, False): "none", (True, False): "importance", (False, True): "type", (True, True): "both"}[(command.importance is not None, command.type is not None)]
+
+            return user.trends.trend(command.period, by, importances, types, command.since, command.until)
+
+        case "overdue":
+            return overdue_tasks(user.userdata, user.deadlines)
+
+        case "due":
+            return due_tasks(user.userdata, command.hours, user.deadlines)
+
+        case "import":
+            first_id = int(user.userdata.index.max()) + 1 if len(user.userdata) else 1
+            tasks, errors = parse_tasks(read_tasks(command.file.replace("{user}", user.username)), first_id)
+
+            if errors:
+                raise ValueError("The file could not be imported :\n" + "\n".join(f" - {error}" for error in errors))
+
+            user.add_tasks(tasks)
+
+            return {"Imported Tasks": len(tasks), "First ID": first_id, "Last ID": first_id + len(tasks) - 1}
+
+
+def run_once(usernames, command):
+    """
+    - Runs a command which covers all the users at once, returns (output dataframe, errors of single users)
+    """
+
+    match command.command:
+
+        case "report":
+            return run_report(usernames, command.workers, command.detailed, command.percentiles)
+
+        case "archive":
+            # files without {user} are only read once
+            paths = list(dict.fromkeys(path.replace("{user}", username) for path in command.file for username in usernames))
+
+            return analyse_archives(paths, command.detailed), []
+
+
+def write_output(name, command, data):
+    """
+    - Prints the output of a command, or writes it to the --export file ({user} is replaced with name)
+    - Returns False if the output couldn't be written
+    """
+
+    if command.export is None:
+        print(f"\n{name} - {command.command} :")
+
+        if isinstance(data, dict):
+            for key, value in data.items():
+                print(f"{key} - {value}")
+        else:
+            print(data)
+
+        return True
+
+    destination = command.export.replace("{user}", name)
+
+    try:
+        if isinstance(data, dict):
+            with open(destination, "w") as f:
+                json.dump(data, f, indent=4)
+        else:
+            export_frame(data, destination, command.format.replace("-", " "))
+        print(f"{name} - {command.command} exported - {destination}")
+
+    except (OSError, ImportError) as E:
+        print(f"\n{name} - {E}", file=sys.stderr)
+        return False
+
+    return True
+
+
+def run_all_users(usernames, command):
+    """
+    - Runs a command which covers all the users at once (report, archive) and writes its output
+    - Returns the exit status, 1 if the command or any user failed
+    """
+
+    status = 0
+
+    try:
+        with phase(f"command {command.command}") as p:
+            data, errors = run_once(usernames, command)
+            p.rows = len(data)
+
+    # eg an archive which can't be read or has invalid rows
+    except (OSError, ValueError, ImportError) as E:
+        print(f"\nall_users - {command.command} : {E}", file=sys.stderr)
+        return 1
+
+    for error in errors:
+        print(f"\n{error}", file=sys.stderr)
+        status = 1
+
+    if not write_output("all_users", command, data):
+        status = 1
+
+    return status
+
+
+def run_users(usernames, users, storage, commands):
+    """
+    - Loads every user in turn and runs the commands for them, in order
+    - A user whose data cannot be loaded is skipped, returns the exit status (1 if any user or command failed)
+    """
+
+    status = 0
+
+    for username in usernames:
+
+        try:
+            with phase("load user"):
+                user = Login(username, users=users, storage=storage)
+
+        except KeyError:
+            print(f"\n{username} - User not found", file=sys.stderr)
+            status = 1
+            continue
+
+        except FileNotFoundError:
+            print(f"\n{username} - The data file couldn't be found.", file=sys.stderr)
+            status = 1
+            continue
+
+        for command in commands:
+
+            try:
+                with phase(f"command {command.command}") as p:
+                    data = run_command(user, command)
+                    p.rows = None if isinstance(data, dict) else len(data)
+
+            # eg an import file which can't be read or has invalid rows
+            except (OSError, ValueError) as E:
+                print(f"\n{username} - {command.command} : {E}", file=sys.stderr)
+                status = 1
+                continue
+
+            if not write_output(username, command, data):
+                status = 1
+
+    return status
+
+
+def run_batch(argv):
+    """
+    - Runs the commands in argv for every selected user, in the order they are given
+    - Consecutive commands are run for one user after the other (each user is loaded once for them), report and archive
+      are run once for all the users at their place, so eg 'import + report' reports on the imported tasks
+    - Returns the exit status (1 if any user or command failed)
+    """
+
+    options, commands = parse(argv)
+
+    try:
+        users = UsersRegistry(USERS_FILE)
+
+    except FileNotFoundError:
+        print("\nUsers file could not be found")
+        return 1
+
+    # one database connection is shared by all the users
+    storage = SQLiteStorage() if BACKEND == "sqlite" else None
+
+    usernames = list(users) if options.all_users else [j.strip().lower() for j in options.user.split(",") if j.strip()]
+    status = 0
+
+    # commands are split into runs of commands for every user and commands covering all the users at once
+    for once, group in groupby(commands, key=lambda command: command.command in ONCE):
+
+        if once:
+            # reports and archives cover all the users at once, users are loaded by the report's own processes
+            for command in group:
+                status = max(status, run_all_users(usernames, command))
+
+        else:
+            status = max(status, run_users(usernames, users, storage, list(group)))
+
+    return status
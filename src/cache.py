@@ -0,0 +1,253 @@
+"""
+- Least recently used cache of analysis results, so repeated reports on unchanged data aren't recomputed
+- Results are keyed by user, data version and the selected categories (see Login.cached)
+- Optionally persisted next to the user's datafile (<path>.cache) so the results also last across sessions
+- The cache file is plain json (the values, dtype and index of every result dataframe), never code, and is stamped with
+  its format and the pandas version, a cache of another format or pandas version is simply dropped
+- The file is written once when the program exits, only if a result was added, results which can't be stored are skipped
+"""
+
+import atexit
+import json
+import os
+from datetime import datetime, timedelta
+
+from utils import lazy_import
+
+# pandas is only imported once persisted results are actually read or written
+pd = lazy_import("pandas")
+
+# number of results kept, the least recently used result is dropped first
+CACHE_SIZE = 64
+
+# layout version of the cache file, files of another version are dropped
+CACHE_FORMAT = 2
+
+
+def to_key(value):
+    # keys are tuples, json turns them into lists
+    return tuple(to_key(j) for j in value) if isinstance(value, list) else value
+
+
+def encode_value(value):
+    """
+    - Converts a value of an object column which json can't store, eg the timedelta metrics of an analysis
+    """
+
+    if isinstance(value, timedelta):
+        return {"timedelta": [value.days, value.seconds, value.microseconds]}
+
+    if isinstance(value, pd.Timestamp):
+        return {"timestamp": value.isoformat()}
+
+    if isinstance(value, datetime):
+        return {"datetime": value.isoformat()}
+
+    # numpy scalars (eg int64 counts)
+    if hasattr(value, "item"):
+        return value.item()
+
+    raise TypeError(f"{type(value).__name__} results can't be cached on disk")
+
+
+def decode_value(value):
+    if isinstance(value, dict) and "timedelta" in value:
+        return timedelta(*value["timedelta"])
+
+    if isinstance(value, dict) and "timestamp" in value:
+        return pd.Timestamp(value["timestamp"])
+
+    if isinstance(value, dict) and "datetime" in value:
+        return datetime.fromisoformat(value["datetime"])
+
+    return value
+
+
+def encode_frame(data):
+    """
+    - Returns a result dataframe as a dict of its columns, the dtype of each column and the index
+    - Datetime and timedelta columns are stored as text, categorical columns as their values along with the categories
+    - Missing values (NaT, NA) are stored as None, their rows are kept for object columns so they are restored there too
+    """
+
+    columns = []
+    dtypes = []
+
+    for _, column in data.items():
+        dtype = {"dtype": str(column.dtype)}
+
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            dtype["categories"] = column.cat.categories.tolist()
+            dtype["ordered"] = bool(column.cat.ordered)
+            column = column.astype(object)
+
+        if column.dtype.kind in "mM":
+            column = column.astype(str).where(column.notna(), None)
+
+        values = column.tolist()
+
+        for name, missing in [("nat", pd.NaT), ("na", pd.NA)]:
+            rows = [i for i, j in enumerate(values) if j is missing]
+
+            if rows:
+                values = [None if j is missing else j for j in values]
+
+                # typed columns get their missing value back from the dtype
+                if column.dtype == object:
+                    dtype[name] = rows
+
+        columns.append(values)
+        dtypes.append(dtype)
+
+    return {"columns": list(data.columns), "dtypes": dtypes, "index": data.index.tolist(), "data": columns}
+
+
+def decode_frame(encoded):
+    """
+    - Rebuilds a result dataframe from encode_frame(), with the same dtypes
+    """
+
+    data = {}
+
+    for i, (values, dtype) in enumerate(zip(encoded["data"], encoded["dtypes"])):
+        values = [decode_value(j) for j in values]
+
+        for name, missing in [("nat", pd.NaT), ("na", pd.NA)]:
+            for row in dtype.get(name, []):
+                values[row] = missing
+
+        column = pd.Series(values, dtype=object)
+
+        if "categories" in dtype:
+            column = pd.Series(pd.Categorical(column, categories=dtype["categories"], ordered=dtype["ordered"]))
+
+        # object columns are kept as they are (eg mixed text and numbers of the analysis values)
+        elif dtype["dtype"] != "object":
+            column = column.astype(dtype["dtype"])
+
+        data[i] = column
+
+    data = pd.DataFrame(data)
+    data.columns = encoded["columns"]
+
+    # a range index (the usual one) is stored as its values too
+    if encoded["index"] != list(range(len(data))):
+        data.index = [decode_value(j) for j in encoded["index"]]
+
+    return data
+
+
+class ResultCache:
+
+    def __init__(self, size=CACHE_SIZE, path=None):
+        """
+        - path is the file the cache is persisted to, None to only keep it in memory
+        - Persisted results are only read when the cache is first used
+        """
+
+        self.size = size
+        self.path = path
+
+        # key : result, ordered from least to most recently used
+        self.results = None
+
+        # whether results were added since the cache file was read
+        self.changed = False
+
+    def load(self):
+        """
+        - Reads the persisted results, a missing, unreadable or outdated cache file gives an empty cache
+        """
+
+        self.results = {}
+
+        if self.path is None:
+            return
+
+        try:
+            with open(self.path, "r") as f:
+                stored = json.load(f)
+
+            if stored.get("format") != CACHE_FORMAT or stored.get("pandas") != pd.__version__:
+                return
+
+            self.results = {to_key(key): decode_frame(encoded) for key, encoded in stored["results"]}
+
+        # the cache is only a cache, results are simply computed again (eg no file yet, or a file of an older version)
+        except (OSError, ValueError, TypeError, KeyError, AttributeError):
+            self.results = {}
+
+    def save(self):
+        """
+        - Writes the results to the cache file (through a temporary file so a partial cache is never read)
+        - Run when the program exits, nothing is written if no result was added
+        - A result which can't be stored (eg a value json can't hold) is skipped, it's simply computed again next session
+        """
+
+        if self.path is None or not self.changed:
+            return
+
+        results = []
+
+        for key, result in self.results.items():
+            try:
+                encoded = [key, encode_frame(result)]
+
+                # every result is checked on its own, so one result which can't be stored doesn't keep the others from being saved
+                json.dumps(encoded, default=encode_value)
+
+            except (TypeError, ValueError, AttributeError):
+                continue
+
+            results.append(encoded)
+
+        try:
+            with open(f"{self.path}.tmp", "w") as f:
+                json.dump({"format": CACHE_FORMAT, "pandas": pd.__version__, "results": results}, f, default=encode_value)
+
+            os.replace(f"{self.path}.tmp", self.path)
+
+        except OSError:
+            pass
+
+        self.changed = False
+
+    def get(self, key, compute):
+        """
+        - Returns the result stored for key, or computes it with compute() and stores it
+        - Results are shared between calls and shouldn't be modified
+        """
+
+        if self.results is None:
+            self.load()
+
+        if key in self.results:
+            # moves the result to the most recently used end
+            self.results[key] = self.results.pop(key)
+            return self.results[key]
+
+        result = compute()
+        self.results[key] = result
+
+        # drops the least recently used results
+        while len(self.results) > self.size:
+            del self.results[next(iter(self.results))]
+
+        # the cache file is written once at exit instead of after every new result
+        if self.path is not None and not self.changed:
+            atexit.register(self.save)
+
+        self.changed = True
+
+        return result
+
+    def clear(self):
+        """
+        - Drops all the results and removes the cache file
+        """
+
+        self.results = {}
+        self.changed = False
+
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
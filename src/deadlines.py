@@ -0,0 +1,104 @@
+"""
+- Deadline index of the ongoing tasks of a user, kept sorted by deadline
+- Built once from the userdata, then adding, editing or deleting a task only inserts/removes its entry (binary search)
+- Overdue tasks and tasks due in the next hours are a binary search + slice, completed tasks are never looked at
+"""
+
+import bisect
+from datetime import datetime, timedelta
+
+from utils import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+
+def nanoseconds(value):
+    """
+    - Converts a datetime into nanoseconds since the epoch, the unit the index is kept in
+    """
+
+    return pd.Timestamp(value).as_unit("ns").value
+
+
+class DeadlineIndex:
+
+    def __init__(self, userdata):
+        """
+        - Builds the index from the typed userdata, ongoing tasks without a deadline are left out
+        """
+
+        ongoing = userdata[(userdata["Status"] == "Ongoing") & userdata["Deadline"].notna()]
+
+        deadlines = ongoing["Deadline"].to_numpy().astype("datetime64[ns]").astype("int64")
+        taskids = ongoing.index.to_numpy()
+
+        # (deadline in ns, task id) pairs sorted by deadline, then task id
+        order = np.lexsort((taskids, deadlines))
+        self.entries = list(zip(deadlines[order].tolist(), taskids[order].tolist()))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def entry(self, taskid, task):
+        """
+        - Returns the entry of a task (row of the typed userdata), None if it isn't in the index
+        """
+
+        if task["Status"] != "Ongoing" or pd.isna(task["Deadline"]):
+            return None
+
+        return (nanoseconds(task["Deadline"]), int(taskid))
+
+    def add(self, taskid, task):
+        entry = self.entry(taskid, task)
+
+        if entry is not None:
+            bisect.insort(self.entries, entry)
+
+    def remove(self, taskid, task):
+        entry = self.entry(taskid, task)
+
+        if entry is None:
+            return
+
+        i = bisect.bisect_left(self.entries, entry)
+
+        if i < len(self.entries) and self.entries[i] == entry:
+            del self.entries[i]
+
+    def update(self, taskid, before, after):
+        """
+        - Applies a change of a task, before/after are the rows of the task before and after the change (None if added/deleted)
+        """
+
+        if before is not None:
+            self.remove(taskid, before)
+
+        if after is not None:
+            self.add(taskid, after)
+
+    def overdue(self, now=None):
+        """
+        - Returns the ids of the ongoing tasks with a deadline before now, earliest deadline first
+        """
+
+        if now is None:
+            now = datetime.today().replace(microsecond=0)
+
+        end = bisect.bisect_left(self.entries, (nanoseconds(now),))
+
+        return [taskid for _, taskid in self.entries[:end]]
+
+    def due(self, hours, now=None):
+        """
+        - Returns the ids of the ongoing tasks due in the next hours (deadline from now up to now + hours), earliest deadline first
+        """
+
+        if now is None:
+            now = datetime.today().replace(microsecond=0)
+
+        start = bisect.bisect_left(self.entries, (nanoseconds(now),))
+        end = bisect.bisect_left(self.entries, (nanoseconds(now + timedelta(hours=hours)) + 1,))
+
+        return [taskid for _, taskid in self.entries[start:end]]
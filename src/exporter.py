@@ -0,0 +1,187 @@
+"""
+- Writes dataframes (task listings or analyses) to files a chunk of rows at a time, so memory use stays bounded
+- Formats : json (pretty, the default, same layout as the userdata of the datafile), compact json, ndjson, csv and parquet
+- Task rows are written the way they are stored in the datafile (see format_userdata), parquet keeps the typed columns
+- Parquet needs pyarrow, which is optional
+"""
+
+import json
+
+from login import format_userdata
+from instrument import phase
+from utils import lazy_import
+
+pd = lazy_import("pandas")
+
+# number of rows formatted and written at a time
+CHUNK_SIZE = 10000
+
+# export format : file extension
+FORMATS = {"json": ".json", "compact json": ".json", "ndjson": ".ndjson", "csv": ".csv", "parquet": ".parquet"}
+
+
+def chunks(data, ids=None, size=CHUNK_SIZE):
+    """
+    - Yields the rows of data in chunks of size rows, only the rows of ids (in that order) if given
+    """
+
+    total = len(data) if ids is None else len(ids)
+
+    for start in range(0, total, size):
+        yield data.iloc[start:start + size] if ids is None else data.loc[ids[start:start + size]]
+
+
+def index_label(data):
+    # name of the index column in ndjson, csv and parquet files
+    return data.index.name or "Index"
+
+
+def records(data, ids=None):
+    """
+    - Yields (index, record dict) of every row, formatted the way it is stored in the datafile
+    """
+
+    for chunk in chunks(data, ids):
+        chunk = format_userdata(chunk)
+
+        yield from zip(chunk.index.tolist(), chunk.to_dict(orient="records"))
+
+
+def write_json(f, data, ids=None, pretty=True):
+    """
+    - Writes the rows as a json object of index : record, a chunk of rows at a time
+    - Each chunk is encoded as a whole and the chunks are joined, so pretty json is laid out exactly like json.dump(..., indent=4)
+    """
+
+    f.write("{")
+    empty = True
+
+    for chunk in chunks(data, ids):
+        rows = format_userdata(chunk).to_dict(orient="index")
+
+        if pretty:
+            # the braces of the chunk (and the newline before the closing one) are dropped
+            text = json.dumps(rows, indent=4, default=str)[1:-2]
+
+        else:
+            text = json.dumps(rows, separators=(",", ":"), default=str)[1:-1]
+
+        f.write(text if empty else f",{text}")
+        empty = False
+
+    f.write("\n}" if pretty and not empty else "}")
+
+
+def write_ndjson(f, data, ids=None):
+    """
+    - Writes a json record per line, the index is the first field of each record
+    """
+
+    label = index_label(data)
+
+    for index, record in records(data, ids):
+        f.write(json.dumps({label: index, **record}, default=str) + "\n")
+
+
+def write_csv(f, data, ids=None):
+    """
+    - Writes the rows as csv, the header is only written with the first chunk
+    """
+
+    label = index_label(data)
+    header = True
+
+    for chunk in chunks(data, ids):
+        format_userdata(chunk).to_csv(f, header=header, index_label=label)
+        header = False
+
+    # an empty listing still gets its header
+    if header:
+        format_userdata(data.iloc[:0]).to_csv(f, index_label=label)
+
+
+def parquet_frame(chunk, label):
+    """
+    - Returns the chunk with its index as a column and mixed object columns (eg analysis values) as text
+    """
+
+    chunk = chunk.rename_axis(label).reset_index()
+
+    for column in chunk.columns[chunk.dtypes == object]:
+        if pd.api.types.infer_dtype(chunk[column], skipna=True) not in ["string", "empty"]:
+            chunk[column] = chunk[column].map(str).where(chunk[column].notna(), None)
+
+    return chunk
+
+
+def write_parquet(destination, data, ids=None):
+    """
+    - Writes the rows as a parquet file with the typed columns, a row group per chunk
+    - Raises ImportError if pyarrow isn't installed
+    """
+
+    try:
+        import pyarrow
+        import pyarrow.parquet
+
+    except ImportError:
+        raise ImportError("Parquet export needs pyarrow (pip install pyarrow)")
+
+    label = index_label(data)
+    writer = None
+
+    try:
+        for chunk in chunks(data, ids):
+            # every chunk is converted to the schema of the first one
+            table = pyarrow.Table.from_pandas(parquet_frame(chunk, label), schema=writer.schema if writer else None, preserve_index=False)
+
+            if writer is None:
+                writer = pyarrow.parquet.ParquetWriter(destination, table.schema)
+
+            writer.write_table(table)
+
+    finally:
+        if writer is not None:
+            writer.close()
+
+    # an empty listing still gets its columns
+    if writer is None:
+        pyarrow.parquet.write_table(pyarrow.Table.from_pandas(parquet_frame(data.iloc[:0], label), preserve_index=False), destination)
+
+
+def export_frame(data, destination, format="json", ids=None):
+    """
+    - Writes data (pandas dataframe) to the destination file in format (one of FORMATS), without asking anything
+    - Only the rows of ids (array of index values, in that order) are written if given, eg a task listing
+    - Datetimes are converted to strings the same way as in the datafile, durations are written as text
+    """
+
+    if format not in FORMATS:
+        raise ValueError(f"{format} is not a valid export format")
+
+    with phase(f"export {format}", len(data) if ids is None else len(ids)):
+        write_file(data, destination, format, ids)
+
+
+def write_file(data, destination, format, ids=None):
+    # writes the file of export_frame()
+
+    if format == "parquet":
+        write_parquet(destination, data, ids)
+        return
+
+    with open(destination, "w", newline="" if format == "csv" else None) as f:
+
+        match format:
+
+            case "json":
+                write_json(f, data, ids)
+
+            case "compact json":
+                write_json(f, data, ids, pretty=False)
+
+            case "ndjson":
+                write_ndjson(f, data, ids)
+
+            case "csv":
+                write_csv(f, data, ids)
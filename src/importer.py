@@ -0,0 +1,130 @@
+"""
+- Bulk import of tasks from csv or ndjson files (eg history from other trackers, or exports of this program)
+- The whole file is validated and parsed at once (vectorized), nothing is imported if any row is invalid
+- Required fields : Task Name, Task Type, Task Importance, Start Time, Deadline
+- Optional fields : Completed On (empty or 'Ongoing' for ongoing tasks), Is Outlier, Notes, other fields are ignored
+- Timestamps are ISO 8601 (eg '2025-11-05 09:00:00', the datafile format), was late and duration are computed
+"""
+
+from login import COLUMNS, compact_userdata
+from tasks import taskcategories, importancecategories
+from utils import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+REQUIRED = ["Task Name", "Task Type", "Task Importance", "Start Time", "Deadline"]
+OPTIONAL = ["Completed On", "Is Outlier", "Notes"]
+
+# accepted values of the outlier field
+OUTLIER_VALUES = {"": False, "false": False, "no": False, "0": False, "true": True, "yes": True, "1": True}
+
+# number of invalid rows listed when a file is rejected
+ERRORS_SHOWN = 10
+
+
+def read_tasks(path):
+    """
+    - Returns the rows of a csv or ndjson file as a dataframe, fields as they are in the file
+    - Raises ValueError for other files or files which can't be parsed, OSError if the file can't be read
+    """
+
+    if path.lower().endswith(".csv"):
+        return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+    if path.lower().endswith((".ndjson", ".jsonl")):
+        return pd.read_json(path, lines=True, dtype=False, convert_dates=False)
+
+    raise ValueError("Only .csv and .ndjson files can be imported")
+
+
+def parse_times(text):
+    """
+    - Parses ISO 8601 timestamps, invalid ones become NaT, time zones are dropped (local time is kept)
+    """
+
+    times = pd.to_datetime(text, format="ISO8601", errors="coerce")
+
+    if times.dt.tz is not None:
+        times = times.dt.tz_localize(None)
+
+    return times.astype("datetime64[ns]")
+
+
+def parse_tasks(raw, first_id, first_row=1):
+    """
+    - Validates and parses the rows read by read_tasks() into typed tasks with ids from first_id
+    - Returns (tasks, errors), tasks is None if any row is invalid and errors lists the invalid rows
+    - Rows are numbered from first_row in the errors, eg the position of a chunk in the file
+    """
+
+    missing = [column for column in REQUIRED if column not in raw]
+
+    if missing:
+        return None, [f"Missing fields : {', '.join(missing)}"]
+
+    if len(raw) == 0:
+        return None, ["No tasks found in the file"]
+
+    # every field is read as stripped text, missing fields and values are empty
+    text = {column: raw[column].astype(object).where(raw[column].notna(), "").astype(str).str.strip() if column in raw else pd.Series("", index=raw.index) for column in REQUIRED + OPTIONAL}
+
+    tasktype = text["Task Type"].str.capitalize()
+    importance = text["Task Importance"].str.capitalize()
+
+    start = parse_times(text["Start Time"])
+    deadline = parse_times(text["Deadline"])
+
+    ongoing = text["Completed On"].str.lower().isin(["", "ongoing"])
+    completed_on = parse_times(text["Completed On"].where(~ongoing, ""))
+
+    outlier = text["Is Outlier"].str.lower().map(OUTLIER_VALUES)
+
+    # reason : rows it applies to
+    checks = {
+        "empty task name": text["Task Name"] == "",
+        "invalid task type": ~tasktype.isin(taskcategories),
+        "invalid task importance": ~importance.isin(importancecategories),
+        "invalid start time": start.isna(),
+        "invalid deadline": deadline.isna(),
+        "invalid completion time": ~ongoing & completed_on.isna(),
+        "deadline is older than start time": deadline < start,
+        "completion is older than start time": completed_on < start,
+        "invalid outlier flag": outlier.isna(),
+    }
+
+    reasons = list(checks)
+    failed = np.column_stack([check.to_numpy(dtype=bool) for check in checks.values()])
+    invalid = np.flatnonzero(failed.any(axis=1))
+
+    if len(invalid):
+        # rows are numbered in the order they are in the file
+        errors = [f"Row {row + first_row} : {', '.join(reason for reason, fail in zip(reasons, failed[row]) if fail)}" for row in invalid[:ERRORS_SHOWN]]
+
+        if len(invalid) > ERRORS_SHOWN:
+            errors.append(f"... and {len(invalid) - ERRORS_SHOWN} more invalid rows")
+
+        return None, errors
+
+    tasks = pd.DataFrame(
+        {
+            "Task Name": text["Task Name"].to_numpy(),
+            "Task Type": tasktype.to_numpy(),
+            "Task Importance": importance.to_numpy(),
+            "Start Time": start.to_numpy(),
+            "Deadline": deadline.to_numpy(),
+            "Completed On": completed_on.to_numpy(),
+            "Status": np.where(ongoing, "Ongoing", "Completed").astype(object),
+            "Was Late": pd.array(completed_on > deadline, dtype="boolean"),
+            "Duration": (completed_on - start).to_numpy(),
+            "Is Outlier": outlier.astype(bool).to_numpy(),
+            "Notes": text["Notes"].to_numpy(),
+        },
+        columns=COLUMNS,
+        index=pd.RangeIndex(first_id, first_id + len(raw)),
+    )
+
+    # was late is only known for completed tasks
+    tasks.loc[ongoing.to_numpy(), "Was Late"] = pd.NA
+
+    return compact_userdata(tasks), []
@@ -0,0 +1,176 @@
+"""
+- Latency instrumentation of a session : every menu action (or batch command) and the phases run inside it
+  (reading the datafile, datetime conversion, filtering, sorting, aggregation, serializing and writing the datafile)
+- Each phase records its wall time, cpu time and number of rows, phases are nested inside the action which ran them
+- Enabled with the TASK_ANALYZER_PROFILE environment variable (or main.py --profile), otherwise phases cost almost nothing
+- A summary per phase is printed when the program exits, and optionally :
+    - TASK_ANALYZER_PROFILE_TRACE=<path> writes every phase to a trace (chrome trace event json), which opens as a
+      flame graph in chrome://tracing, Perfetto or speedscope
+    - TASK_ANALYZER_PROFILE_ACTION=<phase name> runs cProfile over every run of that phase (eg 'action analyse tasks')
+      and dumps the stats to <phase name>-<run>.pstats in the current directory (read with python -m pstats)
+"""
+
+import cProfile
+import json
+import os
+import re
+import sys
+import time
+
+# path of the trace file and name of the phase to run cProfile over, both also enable the instrumentation
+TRACE = os.environ.get("TASK_ANALYZER_PROFILE_TRACE")
+PROFILED = os.environ.get("TASK_ANALYZER_PROFILE_ACTION")
+
+ENABLED = bool(os.environ.get("TASK_ANALYZER_PROFILE") or TRACE or PROFILED)
+
+# start of the session, phase start times are relative to it
+STARTED = time.perf_counter()
+
+# finished phases as (name, start, wall time, cpu time, rows, depth), in the order they finished
+records = []
+# names of the running phases, innermost last
+stack = []
+# phase name : number of runs profiled so far, every run gets its own stats file
+profiled_runs = {}
+
+
+class Phase:
+
+    __slots__ = ("name", "rows", "start", "cpu", "profiler")
+
+    def __init__(self, name, rows=None):
+        """
+        - A timed phase, used as a context manager, rows can also be set inside it once they are known
+        """
+
+        self.name = name
+        self.rows = rows
+        self.profiler = None
+
+    def __enter__(self):
+
+        # cProfile can't run twice at once, so a phase nested in itself is only profiled once
+        if self.name == PROFILED and PROFILED not in stack:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+        stack.append(self.name)
+
+        self.cpu = time.process_time()
+        self.start = time.perf_counter()
+
+        return self
+
+    def __exit__(self, *exception):
+        wall = time.perf_counter() - self.start
+        cpu = time.process_time() - self.cpu
+
+        stack.pop()
+
+        if self.profiler is not None:
+            self.profiler.disable()
+
+            run = profiled_runs[self.name] = profiled_runs.get(self.name, 0) + 1
+            filename = re.sub(r"[^\w-]+", "_", self.name)
+
+            self.profiler.dump_stats(f"{filename}-{run}.pstats")
+
+        records.append((self.name, self.start - STARTED, wall, cpu, self.rows, len(stack)))
+
+        # exceptions raised in the phase are not handled here
+        return False
+
+
+class Disabled:
+    """
+    - Returned by phase() when instrumentation is off, does nothing (rows set on it are ignored)
+    """
+
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        return False
+
+
+DISABLED = Disabled()
+
+
+def phase(name, rows=None):
+    """
+    - Returns a context manager timing the code run inside it as the phase name, eg : with phase("sort") as p: ...
+    """
+
+    return Phase(name, rows) if ENABLED else DISABLED
+
+
+def enable():
+    # turns the instrumentation on for the rest of the session (main.py --profile)
+    global ENABLED
+    ENABLED = True
+
+
+def summary():
+    """
+    - Returns the lines of the summary : runs, total/mean wall time, total cpu time and rows of every phase
+    - Phases are listed in the order they first started, nested phases are indented under their action
+    """
+
+    phases = {}
+
+    for name, _, wall, cpu, rows, depth in sorted(records, key=lambda record: record[1]):
+        runs = phases.setdefault(name, {"depth": depth, "runs": 0, "wall": 0.0, "cpu": 0.0, "rows": None})
+        runs["runs"] += 1
+        runs["wall"] += wall
+        runs["cpu"] += cpu
+
+        if rows is not None:
+            runs["rows"] = (runs["rows"] or 0) + rows
+
+    lines = [f"{'phase':<40} {'runs':>6} {'wall ms':>10} {'mean ms':>10} {'cpu ms':>10} {'rows':>10}"]
+
+    for name, runs in phases.items():
+        label = ("  " * runs["depth"] + name)[:40]
+        rows = "" if runs["rows"] is None else runs["rows"]
+
+        lines.append(f"{label:<40} {runs['runs']:>6} {runs['wall'] * 1000:>10.1f} {runs['wall'] * 1000 / runs['runs']:>10.1f} {runs['cpu'] * 1000:>10.1f} {rows:>10}")
+
+    return lines
+
+
+def write_trace(path):
+    """
+    - Writes every phase as a complete event of the chrome trace event format (times in microseconds)
+    """
+
+    events = [
+        {"name": name, "ph": "X", "ts": round(start * 1e6), "dur": round(wall * 1e6), "pid": os.getpid(), "tid": 1, "args": {"cpu ms": round(cpu * 1000, 3), "rows": rows}}
+        for name, start, wall, cpu, rows, _ in records
+    ]
+
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def report():
+    """
+    - Prints the summary (to stderr, so outputs aren't mixed with it) and writes the trace, run when the program exits
+    """
+
+    if not records:
+        return
+
+    print("\n[profile]", file=sys.stderr)
+
+    for line in summary():
+        print(f"[profile] {line}", file=sys.stderr)
+
+    if TRACE:
+        try:
+            write_trace(TRACE)
+            print(f"[profile] trace written - {TRACE}", file=sys.stderr)
+
+        except OSError as E:
+            print(f"[profile] trace could not be written - {E}", file=sys.stderr)
@@ -4,34 +4,252 @@
 - Changing username/password of a user
 - Deleting account of the user
 - Exporting the users datafile and user individual datafile
+- Journaling single task changes and compacting the journal into the user individual datafile
 - Custom exporting passed data to a input path
+- Caching analysis results of the loaded data version
 """
 
-import pandas as pd
 import json
 import sys
 import os
 
-from utils import consent
+from utils import consent, lazy_import
+from storage import SQLiteStorage
+from snapshot import load_snapshot, save_snapshot, snapshot_wanted, file_key
+from cache import ResultCache
+from aggregates import Aggregates
+from masks import Masks
+from deadlines import DeadlineIndex
+from orders import Orders
+from trends import Trends
+from users import UsersRegistry
+from instrument import phase
+
+# numpy and pandas are only imported once the userdata is actually used, login and user stats don't need them
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
 
 # file path of where the users data file is stored
 USERS_FILE = "database/users.csv"
 # directory name where user's individual files are stored
 DATABASE = "database"
+# storage backend of userstats and userdata, 'json' (individual datafiles) or 'sqlite'
+BACKEND = os.environ.get("TASK_ANALYZER_BACKEND", "json")
+# analysis results cache, 'memory' (current session only) or 'disk' (also persisted next to the user's datafile)
+CACHE = os.environ.get("TASK_ANALYZER_CACHE", "memory")
+
+# columns of the userdata dataframe, status is not stored in the datafile
+COLUMNS = ["Task Name", "Task Type", "Task Importance", "Start Time", "Deadline", "Completed On", "Status", "Was Late", "Duration", "Is Outlier", "Notes"]
+DATETIME_COLUMNS = ["Start Time", "Deadline", "Completed On"]
+# values of the status column
+STATUSES = ["Completed", "Ongoing"]
+
+# number of journal entries after which the journal is compacted into the user's datafile
+JOURNAL_LIMIT = 100
+
+
+def load_userdata(records):
+    """
+    - Builds the typed userdata dataframe from the userdata dict of a user's datafile
+    - All datetime columns are parsed at once, 'Ongoing' completion is stored as NaT and Status is set to 'Ongoing'
+    - Columns are then converted into the compact schema (see compact_userdata)
+    """
+
+    userdata = pd.DataFrame.from_dict(records, orient="index", columns=[i for i in COLUMNS if i != "Status"])
+    userdata.index = userdata.index.astype(int)
+
+    ongoing = userdata["Completed On"] == "Ongoing"
+    userdata["Completed On"] = userdata["Completed On"].mask(ongoing)
+
+    with phase("convert datetimes", len(userdata)):
+        for column in DATETIME_COLUMNS:
+            userdata[column] = pd.to_datetime(userdata[column], format="ISO8601")
+
+    userdata.insert(COLUMNS.index("Status"), "Status", pd.Series("Completed", index=userdata.index).mask(ongoing, "Ongoing"))
+
+    # durations are stored as text in the datafile (eg '1 days 04:10:00')
+    userdata["Duration"] = parse_durations(userdata["Duration"])
+
+    return compact_userdata(userdata)
+
+
+def compact_userdata(userdata):
+    """
+    - Converts the columns of userdata (in place) into the compact typed schema and returns it
+    - Task type, importance and status are categoricals of the fixed categories (values outside them are kept as extra categories)
+    - Categories are sorted, so sorting by these columns gives the same order as sorting the text
+    - Was Late is a nullable boolean, duration is whole seconds (timedelta64[s]) and NaT for ongoing tasks
+    """
+
+    from tasks import taskcategories, importancecategories
+
+    for column, fixed in [("Task Type", taskcategories), ("Task Importance", importancecategories), ("Status", STATUSES)]:
+        categories = sorted(set(fixed) | set(userdata[column].dropna().unique()))
+        userdata[column] = pd.Categorical(userdata[column], categories=categories)
+
+    userdata["Was Late"] = userdata["Was Late"].astype("boolean")
+    userdata["Duration"] = userdata["Duration"].astype("timedelta64[s]")
+    userdata["Is Outlier"] = userdata["Is Outlier"].astype(bool)
+
+    return userdata
+
+
+def parse_durations(durations):
+    """
+    - Converts the duration text of the datafile (eg '0 days 18:11:00') into timedelta64[s], missing durations into NaT
+    - The text is split directly, which is a lot faster than pd.to_timedelta, other layouts fall back to pd.to_timedelta
+    """
+
+    valid = durations.notna().to_numpy()
+    seconds = []
+
+    try:
+        for text in durations.to_numpy()[valid].tolist():
+            days, _, clock = text.partition(" days ")
+            hours, minutes, secs = clock.split(":")
+            seconds.append(int(days) * 86400 + int(hours) * 3600 + int(minutes) * 60 + int(secs))
+
+    except (AttributeError, ValueError):
+        return pd.to_timedelta(durations.astype(object).where(durations.notna(), None)).astype("timedelta64[s]")
+
+    parsed = np.full(len(durations), np.timedelta64("NaT"), dtype="timedelta64[s]")
+    parsed[valid] = np.array(seconds, dtype="int64").astype("timedelta64[s]")
+
+    return pd.Series(parsed, index=durations.index, name=durations.name)
+
+
+def format_durations(durations):
+    """
+    - Converts durations into text the way they are stored in the datafile (eg '0 days 18:11:00'), NaT into None
+    """
+
+    valid = durations.notna().to_numpy()
+    seconds = durations.to_numpy()[valid].astype("timedelta64[s]").astype("int64").tolist()
+
+    text = np.full(len(durations), None, dtype=object)
+    # negative durations are written the way pandas does (eg '-1 days +23:00:00')
+    text[valid] = [f"{s // 86400} days {'+' if s < 0 else ''}{s % 86400 // 3600:02}:{s % 3600 // 60:02}:{s % 60:02}" for s in seconds]
+
+    return pd.Series(text, index=durations.index, name=durations.name)
+
+
+def memory_report(userdata):
+    """
+    - Returns the memory used by each column of userdata in the compact schema and in the previous object schema (text categories and durations)
+    - Values are in bytes, including the text of object columns
+    """
+
+    loose = userdata.astype({"Task Type": object, "Task Importance": object, "Status": object})
+    loose["Duration"] = format_durations(userdata["Duration"]).where(userdata["Duration"].notna(), pd.NA)
+
+    report = pd.DataFrame({
+        "Object Schema": loose.memory_usage(deep=True),
+        "Compact Schema": userdata.memory_usage(deep=True),
+        "Dtype": userdata.dtypes.astype(str),
+    }).reindex(["Index"] + list(userdata.columns)).fillna({"Dtype": ""})
+
+    report.loc["Total"] = [report["Object Schema"].sum(), report["Compact Schema"].sum(), ""]
+    report["Saved (%)"] = (100 - report["Compact Schema"] * 100 / report["Object Schema"]).round(1)
+
+    return report
+
+
+def format_userdata(data):
+    """
+    - Returns a copy of data (userdata or a part of it) formatted the way it is stored in the datafile
+    - Datetime objects are converted into strings, ongoing tasks are stored as 'Ongoing'
+    - Missing values are converted into None, the status column is dropped
+    - Columns which aren't present in data (eg analysis dataframes) are skipped
+    """
+
+    data = data.copy()
+
+    for column in DATETIME_COLUMNS:
+        if column in data:
+            data[column] = data[column].astype(str)
+
+    if "Status" in data:
+        data["Completed On"] = data["Completed On"].mask(data["Status"] == "Ongoing", "Ongoing")
+        data.drop(columns="Status", inplace=True)
+
+    if "Was Late" in data:
+        data["Was Late"] = data["Was Late"].astype(object).where(data["Was Late"].notna(), None)
+
+    if "Duration" in data:
+        data["Duration"] = format_durations(data["Duration"])
+
+    return data
+
+
+def replay_journal(data, path):
+    """
+    - Applies the task changes stored in a journal file to the data loaded from a user's datafile
+    - Entries are applied in order, each entry also carries the userstats after the change
+    - An incomplete last line (eg if the program was closed while writing) is ignored
+    - Returns the number of entries applied
+    """
+
+    entries = 0
+
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+
+                taskid = str(entry["id"])
+
+                if entry["action"] == "insert":
+                    data["userdata"][taskid] = entry["fields"]
+
+                elif entry["action"] == "update":
+                    data["userdata"][taskid].update(entry["fields"])
+
+                else:
+                    data["userdata"].pop(taskid, None)
+
+                data["userstats"] = entry["userstats"]
+                entries += 1
+
+    # if no changes were made since the last compaction
+    except FileNotFoundError:
+        pass
+
+    return entries
 
 
 class Login:
 
-    def __init__(self):
+    def __init__(self, username=None, users=None, storage=None):
+        """
+        - Without a username, the user is asked to login/signup
+        - With a username, that user's data is loaded directly without asking anything (batch mode)
+        - users and storage can be passed to share one registry/database connection between many users
+        """
 
         try:
-            with open(USERS_FILE, "r") as f:
-                self.users_database = pd.read_csv(f)
+            self.users = users if users is not None else UsersRegistry(USERS_FILE)
 
         except FileNotFoundError:
             print("\nUsers file could not be found")
             sys.exit()
 
+        # sqlite database is only opened if it is the selected backend
+        if storage is None and BACKEND == "sqlite":
+            storage = SQLiteStorage()
+
+        self.storage = storage
+
+        # typed userdata is only built (and pandas imported) when it is first used, see the userdata property
+        self._userdata = None
+        self._build_userdata = None
+
+        if username is not None:
+            self.load_user(username)
+            return
+
         # initiates user login/signup process
         self.login_user()
 
@@ -50,48 +268,17 @@ class Login:
             return self.new_user()
 
         # asks and verifies user's password
-        if username in self.users_database["username"].values:
+        if username in self.users:
             password = input("\nPlease enter your password : ").strip()
 
-            if (password == self.users_database[self.users_database["username"] == username]["password"].values):
+            if password == self.users.password(username):
 
                 try:
-                    # attempt to open user's individual datafile
-                    with open(f"database/{username}.json", "r") as f:
-                        data = json.load(f)
-
-                        self.username = username
-                        self.userid = self.users_database[self.users_database["username"] == self.username].index
-                        self.userstats = data["userstats"]
-
-                        if len(data["userdata"]) > 0:
-                            # if userdata exists then loads and formats it
-                            # conversion of dates in string to datetime object
-                            # conversion of nan to pd.NA
-
-                            self.userdata = pd.DataFrame.from_dict(data["userdata"], orient="index")
-                            self.userdata["Start Time"] = pd.to_datetime(self.userdata["Start Time"])
-                            self.userdata["Deadline"] = pd.to_datetime(self.userdata["Deadline"])
-
-                            for i in self.userdata.index:
-                                if self.userdata.loc[i, "Completed On"] != "Ongoing":
-                                    self.userdata.loc[i, "Completed On"] = (pd.to_datetime(self.userdata.loc[i, "Completed On"]))
-
-                            self.userdata.index = self.userdata.index.astype(int)
-
-                            for i in self.userdata.index:
-                                if self.userdata.loc[i, "Was Late"] is None:
-                                    self.userdata.loc[i, "Was Late"] = pd.NA
-                                if self.userdata.loc[i, "Duration"] is None:
-                                    self.userdata.loc[i, "Duration"] = pd.NA
+                    # attempt to load user's individual data
+                    self.load_user(username)
 
-                        # if no data exists in userdata then a new dataframe is created
-                        else:
-                            self.userdata = pd.DataFrame(
-                                columns=["Task Name", "Task Type", "Task Importance", "Start Time", "Deadline", "Completed On", "Was Late", "Duration", "Is Outlier", "Notes"])
-
-                        print("\nLogged in successfully")
-                        return
+                    print("\nLogged in successfully")
+                    return
 
                 # if user's individual file cannot be found
                 except FileNotFoundError:
@@ -108,6 +295,196 @@ class Login:
 
         sys.exit()
 
+    def load_user(self, username):
+        """
+        - Loads the userstats and userdata of a registered user, without asking for the password
+        - Raises KeyError if the user is not registered and FileNotFoundError if their data cannot be found
+        """
+
+        if username not in self.users:
+            raise KeyError(username)
+
+        self.userstats, self._build_userdata = self.import_data(username)
+        self._userdata = None
+        self._aggregates = None
+        self._masks = None
+        self._deadlines = None
+        self._trends = None
+        self.orders = Orders()
+        self.username = username
+
+        # version of the loaded data, the token changes whenever the stored data is written by any session
+        # and the version is bumped by every task change made in this session
+        if self.storage is not None:
+            stat = os.stat(self.storage.path)
+            self.data_token = [stat.st_mtime_ns, stat.st_size]
+
+        else:
+            self.data_token = file_key(f"{DATABASE}/{username}")
+        self.data_version = 0
+
+        self.results = ResultCache(path=f"{DATABASE}/{username}.cache" if CACHE == "disk" else None)
+
+    @property
+    def userdata(self):
+        """
+        - Typed userdata dataframe of the user, built from the loaded data the first time it is used
+        """
+
+        if self._userdata is None and self._build_userdata is not None:
+            with phase("build userdata") as p:
+                self._userdata = self._build_userdata()
+                p.rows = len(self._userdata)
+
+            self._build_userdata = None
+
+        return self._userdata
+
+    @property
+    def aggregates(self):
+        """
+        - Running aggregates of the userdata per (importance, type), built the first time an analysis is run
+        """
+
+        if self._aggregates is None:
+            userdata = self.userdata
+
+            with phase("build aggregates", len(userdata)):
+                self._aggregates = Aggregates(userdata)
+
+        return self._aggregates
+
+    @property
+    def masks(self):
+        """
+        - Boolean masks of the userdata per status, importance and type, built the first time tasks are viewed
+        """
+
+        if self._masks is None:
+            userdata, deadlines = self.userdata, self.deadlines
+
+            with phase("build masks", len(userdata)):
+                self._masks = Masks(userdata, deadlines)
+
+        return self._masks
+
+    @property
+    def deadlines(self):
+        """
+        - Deadline index of the ongoing tasks, built the first time overdue or upcoming tasks are needed
+        """
+
+        if self._deadlines is None:
+            userdata = self.userdata
+
+            with phase("build deadline index", len(userdata)):
+                self._deadlines = DeadlineIndex(userdata)
+
+        return self._deadlines
+
+    @property
+    def trends(self):
+        """
+        - Daily, weekly and monthly rollups of the completed tasks, built the first time a trend is asked for
+        """
+
+        if self._trends is None:
+            userdata = self.userdata
+
+            with phase("build trend rollups", len(userdata)):
+                self._trends = Trends(userdata)
+
+        return self._trends
+
+    def task_changed(self, taskid, before, after):
+        """
+        - Applies a task change to the aggregates, masks, deadline index, trend rollups and sorted orders (before/after are the task rows, None if added/deleted)
+        - Added tasks are already in the userdata, deleted tasks still are
+        - Structures which haven't been built yet are skipped, they're built from the current userdata when needed
+        - Bumps the data version, so cached results of the previous data aren't used
+        """
+
+        if self._aggregates is not None:
+            self._aggregates.update(taskid, before, after)
+
+        if self._masks is not None:
+            self._masks.update(self.userdata.index.get_loc(taskid), before, after)
+
+        if self._deadlines is not None:
+            self._deadlines.update(taskid, before, after)
+
+        if self._trends is not None:
+            self._trends.update(taskid, before, after)
+
+        self.orders.update(taskid, before, after)
+
+        self.data_version += 1
+
+    def add_tasks(self, tasks):
+        """
+        - Adds typed tasks (ids already assigned, eg from importer.parse_tasks) to the userdata in one block
+        - Userstats are updated once and everything is saved in a single write of the datafile (or database)
+        - Aggregates, masks, deadline index, trend rollups and sorted orders are rebuilt when next needed instead of updated a task at a time
+        """
+
+        userdata = self.userdata
+
+        if len(userdata) == 0:
+            self._userdata = tasks
+
+        else:
+            # categories of the userdata are kept, so the columns stay categorical after concatenating
+            tasks = tasks.astype({column: userdata[column].dtype for column in ["Task Type", "Task Importance", "Status"]})
+            self._userdata = pd.concat([userdata, tasks])
+
+        completed = int((tasks["Status"] != "Ongoing").sum())
+
+        self.userstats["Total Tasks"] += len(tasks)
+        self.userstats["Completed Tasks"] += completed
+        self.userstats["Ongoing Tasks"] += len(tasks) - completed
+        self.userstats["Late Tasks"] += int(tasks["Was Late"].sum())
+
+        try:
+            self.userstats["On-Time Rate (%)"] = (self.userstats["Completed Tasks"] - self.userstats["Late Tasks"]) * 100 / self.userstats["Total Tasks"]
+        except ZeroDivisionError:
+            self.userstats["On-Time Rate (%)"] = 0
+
+        self._aggregates = None
+        self._masks = None
+        self._deadlines = None
+        self._trends = None
+        self.orders = Orders()
+        self.data_version += 1
+
+        self.export_data()
+
+    def categories(self, field):
+        """
+        - Returns the distinct values of field (eg 'Task Type') among the user's tasks, in the order they first appear
+        - With the sqlite backend they are read from the database, so the userdata isn't built just to list them
+        """
+
+        if self.storage is not None:
+            return self.storage.categories(self.username, field)
+
+        return list(self.userdata[field].unique())
+
+    def cached(self, key, compute):
+        """
+        - Returns the result of compute() (eg an analysis) for key, computed only once per data version
+        - key identifies the result on the same data, eg ("analyse", importances, types)
+        """
+
+        def timed():
+            # only computations which aren't cached are timed
+            with phase(f"compute {key[0]}") as p:
+                result = compute()
+                p.rows = len(result)
+
+            return result
+
+        return self.results.get((self.username, tuple(self.data_token), self.data_version) + tuple(key), timed)
+
     def new_user(self):
         """
         - Creates a new account for user in the database
@@ -125,7 +502,7 @@ class Login:
 
         # checks if the username already exists in the database
         # if exists, returns login user method
-        if username in self.users_database["username"].values:
+        if username in self.users:
             print("\nUser already exists. Please login or use different username.")
             return self.login_user()
 
@@ -138,11 +515,7 @@ class Login:
         if ask:
             # if user agrees, the users database is updated
             # a new individual user file is created
-
-            if len(self.users_database) == 0:
-                self.users_database.loc[1, :] = [username, password]
-            else:
-                self.users_database.loc[max(self.users_database.index) + 1, :] = [username, password]
+            self.users.add(username, password)
 
             d1 = {"Username": username, "Total Tasks": 0, "Completed Tasks": 0, "Ongoing Tasks": 0, "Late Tasks": 0, "On-Time Rate (%)": 0}
             d2 = pd.DataFrame()
@@ -167,7 +540,7 @@ class Login:
         old = input("\nEnter your current password : ").strip()
 
         # checks if the passwords match
-        if old == self.users_database.loc[self.userid, "password"].values:
+        if old == self.users.password(self.username):
             new = input("\nEnter your new password : ").strip()
 
             print("\nAre you sure you want to change your password?")
@@ -175,8 +548,7 @@ class Login:
 
             if ask:
                 # if user agrees to create the account, users file database is updated and saved
-                self.users_database.loc[self.userid, "password"] = new
-                self.export_data()
+                self.users.set_password(self.username, new)
                 print("\nPassword changed successfully.")
 
             else:
@@ -191,22 +563,41 @@ class Login:
 
         passw = input("\nEnter your password : ").strip()
 
-        if passw == self.users_database.loc[self.userid, "password"].values:
+        if passw == self.users.password(self.username):
             new = input("\nEnter new username : ").strip().lower()
             new = new.replace(" ", "_")
 
+            # checks if the username is already taken
+            if new in self.users or new in ["username", "new"]:
+                print("\nYou cannot choose this username")
+                return
+
             print(f"\nAre you sure you want to change username to {new} ?")
             ask = consent()
 
             if ask:
                 try:
-                    os.rename(f"database/{self.username}.json", f"database/{new}.json")
+                    if self.storage is not None:
+                        self.storage.rename_user(self.username, new)
+
+                    else:
+                        os.rename(f"database/{self.username}.json", f"database/{new}.json")
+
+                        if os.path.exists(f"{DATABASE}/{self.username}.journal"):
+                            os.rename(f"{DATABASE}/{self.username}.journal", f"{DATABASE}/{new}.journal")
+
+                        if os.path.exists(f"{DATABASE}/{self.username}.npz"):
+                            os.remove(f"{DATABASE}/{self.username}.npz")
 
                 except:
                     print("\nError renaming the user file.")
                     return
 
-                self.users_database.loc[self.userid, "username"] = new
+                # cached results are stored under the old username
+                self.results.clear()
+                self.results = ResultCache(path=f"{DATABASE}/{new}.cache" if CACHE == "disk" else None)
+
+                self.users.rename(self.username, new)
                 self.userstats["Username"] = new
                 self.username = new
                 self.export_data()
@@ -221,19 +612,29 @@ class Login:
 
         passw = input("\nEnter your password : ").strip()
 
-        if passw == self.users_database.loc[self.userid, "password"].values:
+        if passw == self.users.password(self.username):
             print("\nAre you sure you want to permanently delete all your account?")
             ask = consent()
 
             if ask:
                 try:
-                    os.remove(f"database/{self.username}.json")
+                    if self.storage is not None:
+                        self.storage.delete_user(self.username)
+
+                    else:
+                        os.remove(f"database/{self.username}.json")
+
+                        if os.path.exists(f"{DATABASE}/{self.username}.journal"):
+                            os.remove(f"{DATABASE}/{self.username}.journal")
+
+                        if os.path.exists(f"{DATABASE}/{self.username}.npz"):
+                            os.remove(f"{DATABASE}/{self.username}.npz")
                 except:
                     print("\nError removing user file.")
                     return
 
-                self.users_database.drop(self.userid, inplace=True)
-                self.export_data(f2=False)
+                self.results.clear()
+                self.users.remove(self.username)
 
                 print("\nAccount deleted successfully.")
                 sys.exit()
@@ -243,54 +644,197 @@ class Login:
         else:
             print("\nWrong password entered.")
 
-    def export_data(self, d21=None, d22=None, f1=True, f2=True):
+    def import_data(self, username):
+        """
+        - Returns the userstats of a user and a function which builds their userdata (typed dataframe, empty if no tasks are added)
+        - Loaded from the sqlite database if selected, only the userstats are read until the userdata is needed
+        - Else loaded from the binary snapshot if it is fresh, or from the datafile with the journal changes applied
+        - Snapshot (only kept for large datafiles) is rebuilt whenever the datafile had to be parsed
+        - Raises FileNotFoundError if the user's data cannot be found
+        """
+
+        if self.storage is not None:
+            with phase("read database"):
+                userstats = self.storage.load_stats(username)
+
+            # tasks are only read from the database once every task is needed, filtered views are queried instead
+            def build():
+                with phase("read database tasks") as p:
+                    records = self.storage.load_tasks(username)
+                    p.rows = len(records)
+
+                return load_userdata(records)
+
+            return userstats, build
+
+        path = f"{DATABASE}/{username}"
+
+        with phase("read snapshot"):
+            snapshot = load_snapshot(path) if snapshot_wanted(path) else None
+
+        if snapshot is not None:
+            userstats, build, self.journal_entries = snapshot
+            return userstats, build
+
+        with phase("read datafile") as p:
+            with open(f"{path}.json", "r") as f:
+                data = json.load(f)
+
+            p.rows = len(data["userdata"])
+
+        # applies the task changes made since the datafile was last written
+        with phase("replay journal"):
+            self.journal_entries = replay_journal(data, f"{path}.journal")
+
+        journal_entries = self.journal_entries
+
+        # the datafile and journal can't change before the userdata is built, as every change needs the userdata
+        def build():
+            userdata = load_userdata(data["userdata"])
+            save_snapshot(path, data["userstats"], userdata, journal_entries)
+
+            return userdata
+
+        return data["userstats"], build
+
+    def export_data(self, d21=None, d22=None, f1=False, f2=True):
         """
         - Allows for updating the database files quickly
-        - Users data file is exported (f1)
+        - Users registry is compacted into the users data file (f1), not needed otherwise as account changes are journaled
         - d21 and d22 are userstats and userdata pandas dataframes by default
         - d21 and d22 are zipped and exported to user's individual datafile (f2)
-        - f1 and f2 can be set to true (default) or false depending on which is to be exported
-
+        - f1 (default false) and f2 (default true) can be set depending on which is to be exported
+        - Writing the user's datafile compacts the journal, as the datafile then contains all the changes
+        - If the sqlite backend is selected, the user's data in the database is replaced instead of the datafile
         """
 
         if d21 is None:
             d21 = self.userstats
 
-        if d22 is None:
-            # a copy is made so as to not alter the database in use
-            d22 = self.userdata.copy()
+        # typed userdata, used for refreshing the snapshot
+        userdata = None
 
+        if d22 is None:
             # formatting the userdata, converting datetime objects into string
-            d22["Start Time"] = d22["Start Time"].astype(str)
-            d22["Deadline"] = d22["Deadline"].astype(str)
-            d22["Completed On"] = d22["Completed On"].astype(str)
+            userdata = self.userdata
+
+            with phase("serialize datafile", len(userdata)):
+                d22 = format_userdata(userdata)
 
         if f1:
             # if the users data file is to be exported
             try:
-                with open(USERS_FILE, "w") as f:
-                    self.users_database.to_csv(f, index=False)
+                self.users.compact()
 
             except:
                 print("\nError saving users database file.")
 
-        if f2:
+        if f2 and self.storage is not None:
+            with phase("write database", len(d22)):
+                self.storage.save(self.username, d21, d22.to_dict(orient="index"))
+
+        elif f2:
             # if the userstats and userdata is to be
             try:
-                with open(f"{DATABASE}/{self.username}.json", "w") as f:
+                with phase("write datafile", len(d22)):
+                    # datafile is written to a temporary file first so a failed write never leaves a partial datafile
+                    with open(f"{DATABASE}/{self.username}.json.tmp", "w") as f:
+
+                        json.dump({"userstats": d21, "userdata": d22.to_dict(orient="index")}, f, indent=4)
 
-                    json.dump({"userstats": d21, "userdata": d22.to_dict(orient="index")}, f, indent=4)
+                    os.replace(f"{DATABASE}/{self.username}.json.tmp", f"{DATABASE}/{self.username}.json")
+
+                # journal is cleared only after the datafile is written
+                if os.path.exists(f"{DATABASE}/{self.username}.journal"):
+                    os.remove(f"{DATABASE}/{self.username}.journal")
+                self.journal_entries = 0
+
+                # snapshot is refreshed so the next login doesn't parse the datafile
+                if userdata is not None:
+                    with phase("save snapshot"):
+                        save_snapshot(f"{DATABASE}/{self.username}", d21, userdata)
 
             except:
                 print("\nError saving user datafile.")
                 sys.exit()
 
-    def custom_export(self, data):
+    def task_record(self, taskid):
+        """
+        - Returns the fields of a task formatted the way they are stored in the datafile
+        """
+
+        return format_userdata(self.userdata.loc[[taskid]]).to_dict(orient="index")[taskid]
+
+    def export_task(self, taskid, action, previous=None):
+        """
+        - Saves a single task change by appending it to the user's journal file instead of rewriting the datafile
+        - action can be 'insert', 'update' or 'delete'
+        - For updates only the fields which differ from previous (task_record before the edit) are written
+        - Current userstats are written with every entry
+        - Journal is compacted into the user's datafile once it has JOURNAL_LIMIT entries
+        - If the sqlite backend is selected, the change is saved as a single row insert/update/delete instead
+        """
+
+        if action == "delete":
+            fields = None
+
+        else:
+            fields = self.task_record(taskid)
+
+            if previous is not None:
+                fields = {key: value for key, value in fields.items() if previous.get(key) != value}
+
+                # nothing is written if no field was changed
+                if not fields:
+                    return
+
+        if self.storage is not None:
+            self.storage.save_task(self.username, taskid, action, fields, self.userstats)
+            return
+
+        try:
+            with open(f"{DATABASE}/{self.username}.journal", "a") as f:
+                f.write(json.dumps({"action": action, "id": int(taskid), "fields": fields, "userstats": self.userstats}) + "\n")
+
+        except:
+            print("\nError saving user datafile.")
+            sys.exit()
+
+        self.journal_entries += 1
+
+        if self.journal_entries >= JOURNAL_LIMIT:
+            self.export_data()
+
+    def custom_export(self, data, ids=None):
         """
-        - Allows exporting of data (pandas dataframe) to a target json datafile
-        - User is asked the path of the file destination without extension
+        - Allows exporting of data (pandas dataframe) to a target file, json by default
+        - Only the rows of ids (array of index values, in that order) are exported if given, eg a task listing
+        - User is asked the format and the path of the file destination without extension
+        - Rows are written a chunk at a time (see exporter.py)
         """
 
+        # exporter imports the formatting functions of this module, so it's imported when needed
+        from exporter import FORMATS, export_frame
+
+        formats = dict(enumerate(FORMATS, start=1))
+
+        print("\nExport formats :")
+        for i, j in formats.items():
+            print(f" {i}. {j}")
+
+        while True:
+            format = input("Enter the code of the export format (or enter for json) : ").strip()
+
+            if format == "":
+                format = "json"
+                break
+
+            if format.isdigit() and int(format) in formats:
+                format = formats[int(format)]
+                break
+
+            print("\nInvalid format code")
+
         while True:
 
             destination = input("\nEnter the full file path (incl name without extension) or 'cancel' : ").strip()
@@ -299,7 +843,7 @@ class Login:
                 return
 
             # extension is added to the destination specified by the user
-            destination = destination + ".json"
+            destination = destination + FORMATS[format]
 
             if os.path.exists(destination):
                 # if a file already exists at the path, user is asked if they want to replace it
@@ -311,28 +855,7 @@ class Login:
                     continue
 
             try:
-
-                with open(destination, "w") as f:
-                    data = data.copy()
-
-                    # try-except is used incase the data passed doesn't have these columns
-                    # converts datetime objects into strings for export
-                    try:
-                        data["Start Time"] = data["Start Time"].astype(str)
-                    except KeyError:
-                        pass
-
-                    try:
-                        data["Deadline"] = data["Deadline"].astype(str)
-                    except KeyError:
-                        pass
-
-                    try:
-                        data["Completed On"] = data["Completed On"].astype(str)
-                    except KeyError:
-                        pass
-
-                    json.dump(data.to_dict(orient="index"), f, indent=4)
+                export_frame(data, destination, format, ids)
 
                 print(f"Data exported successfully - {destination}")
                 return
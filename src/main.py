@@ -1,11 +1,55 @@
+import time
+
+# start time of the program, reported by --startup-profile
+STARTED = time.perf_counter()
+
 from login import Login
 from tasks import Tasks
 from analyse import Analyse
+from batch import run_batch
+from utils import imported
+import instrument
+import atexit
 import os
+import sys
+
+
+# menu code : name of the action, used by the instrumentation (see instrument.py)
+ACTIONS = {
+    "1": "view profile",
+    "2": "quick view tasks",
+    "3": "detailed view tasks",
+    "4": "analyse tasks",
+    "5": "detailed analyse tasks",
+    "6": "add a task",
+    "7": "edit a task",
+    "8": "delete a task",
+    "9": "change username",
+    "10": "change password",
+    "11": "delete account",
+    "12": "overdue / upcoming tasks",
+    "13": "import tasks",
+    "14": "trend analysis",
+    "15": "delay / duration percentiles",
+    "0": "exit",
+    "x": "view options",
+}
+
+
+def startup_profile(stage):
+    """
+    - Prints the time taken since the program started and which of the heavy modules have been imported so far
+    """
+
+    modules = ", ".join(j for j in ["numpy", "pandas"] if imported(j)) or "none"
+    print(f"[startup-profile] {stage} - {(time.perf_counter() - STARTED) * 1000:.1f} ms (imported : {modules})", file=sys.stderr)
 
 
 def main():
     """
+    - '--startup-profile' reports the time taken to import the modules, login and exit
+    - '--profile' (or TASK_ANALYZER_PROFILE) times every action and the phases inside it, see instrument.py
+    - With command line arguments, runs them in batch mode instead (see batch.py) and returns the exit status
     - Asking user to login/create new account
     - Importing/creating database file of the user
     - Presenting user with various features they can use:
@@ -20,19 +64,45 @@ def main():
       9. Change Username
       10. Change Password
       11. Delete Account
+      12. Overdue / Upcoming Tasks
+      13. Import Tasks
+      14. Trend Analysis
+      15. Delay / Duration Percentiles
       0. Exit
     """
 
+    profile = "--startup-profile" in sys.argv
+    argv = [arg for arg in sys.argv[1:] if arg not in ["--startup-profile", "--profile"]]
+
+    if "--profile" in sys.argv:
+        instrument.enable()
+
+    # summary of the timed actions is printed when the program exits, however it exits
+    if instrument.ENABLED:
+        atexit.register(instrument.report)
+
+    if profile:
+        startup_profile("modules imported")
+        # also reported when the program exits early (eg a failed login)
+        atexit.register(startup_profile, "exit")
+
+    if argv:
+        return run_batch(argv)
+
     os.system("cls")
 
     # prompts user to login/signup and loads database
-    user = Login()
+    with instrument.phase("action login"):
+        user = Login()
+
+    if profile:
+        startup_profile("logged in")
 
     tasks = Tasks(user)
     analyse = Analyse(user)
 
     # options which user can use
-    print_options = "\n 1. View Profile \n 2. Quick View Tasks \n 3. Detailed View Tasks \n 4. Analyse Tasks \n 5. Detailed Analyse Tasks \n 6. Add a Task \n 7. Edit a Task \n 8. Delete a Task \n 9. Change Username \n 10. Change Password \n 11. Delete Account \n 0. Exit"
+    print_options = "\n 1. View Profile \n 2. Quick View Tasks \n 3. Detailed View Tasks \n 4. Analyse Tasks \n 5. Detailed Analyse Tasks \n 6. Add a Task \n 7. Edit a Task \n 8. Delete a Task \n 9. Change Username \n 10. Change Password \n 11. Delete Account \n 12. Overdue / Upcoming Tasks \n 13. Import Tasks \n 14. Trend Analysis \n 15. Delay / Duration Percentiles \n 0. Exit"
 
     print("\nHere are all the features you can use :")
     print(print_options)
@@ -43,64 +113,83 @@ def main():
         # asks user to select option code from the menu, or 'x' to view the option menu
         choice = input("\nEnter the code of option (or 'x' to view options): ").strip().lower()
 
-        match choice:
+        # every action is timed when the instrumentation is on
+        with instrument.phase(f"action {ACTIONS.get(choice, 'invalid code')}"):
+
+            match choice:
+
+                # view the user's profile
+                case "1":
+                    tasks.view_profile()
+
+                # view task either by id or all tasks (automatically sorted) & option to export it
+                case "2":
+                    tasks.quick_view_tasks()
+
+                # allow users to give sort and filter instructions before viewing tasks & option to export it
+                case "3":
+                    tasks.view_tasks()
+
+                # allows users to view analysis on tasks & option to export it
+                case "4":
+                    analyse.analyse()
 
-            # view the user's profile
-            case "1":
-                tasks.view_profile()
+                # allows users to view a detailed analysis & option to export it
+                case "5":
+                    analyse.detailed_analysis()
 
-            # view task either by id or all tasks (automatically sorted) & option to export it
-            case "2":
-                tasks.quick_view_tasks()
+                # allows user to add a task
+                case "6":
+                    tasks.add_task()
 
-            # allow users to give sort and filter instructions before viewing tasks & option to export it
-            case "3":
-                tasks.view_tasks()
+                # allows user to edit a task and also mark it as completed
+                case "7":
+                    tasks.edit_task()
 
-            # allows users to view analysis on tasks & option to export it
-            case "4":
-                analyse.analyse()
+                # allows user to permanently delete a task from database
+                case "8":
+                    tasks.del_task()
 
-            # allows users to view a detailed analysis & option to export it
-            case "5":
-                analyse.detailed_analysis()
+                # allows user to change their username
+                case "9":
+                    user.change_username()
 
-            # allows user to add a task
-            case "6":
-                tasks.add_task()
+                # allows user to change their password
+                case "10":
+                    user.change_password()
 
-            # allows user to edit a task and also mark it as completed
-            case "7":
-                tasks.edit_task()
+                # allows user to permanently delete their account
+                case "11":
+                    user.delete_user()
 
-            # allows user to permanently delete a task from database
-            case "8":
-                tasks.del_task()
+                # shows overdue tasks or tasks due in the next hours & option to export it
+                case "12":
+                    tasks.deadline_tasks()
 
-            # allows user to change their username
-            case "9":
-                user.change_username()
+                # allows user to add many tasks at once from a csv/ndjson file
+                case "13":
+                    tasks.import_tasks()
 
-            # allows user to change their password
-            case "10":
-                user.change_password()
+                # allows user to view trends of the completed tasks over time & option to export them
+                case "14":
+                    analyse.trend_analysis()
 
-            # allows user to permanently delete their account
-            case "11":
-                user.delete_user()
+                # allows user to view the percentiles of delay and duration & option to export them
+                case "15":
+                    analyse.percentile_analysis()
 
-            # exiting the program
-            case "0":
-                return
+                # exiting the program
+                case "0":
+                    return
 
-            # printing the options menu
-            case "x":
-                print(print_options)
+                # printing the options menu
+                case "x":
+                    print(print_options)
 
-            # user enters an invalid code
-            case _:
-                print("\nEnter a valid option code")
+                # user enters an invalid code
+                case _:
+                    print("\nEnter a valid option code")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,227 @@
+"""
+- Boolean masks of the tasks of a user per status, importance, type, lateness and outlier flag
+- Masks are numpy arrays with a slot per task, in the order of the rows of the userdata, built once from the userdata
+- Every task change (add, edit, delete) only updates the slot of the task instead of comparing whole columns again
+- Added tasks are appended in spare slots (capacity is doubled when full), deleted tasks are only marked as dead
+  (tombstones), dead slots are dropped from every mask in bulk once TOMBSTONE_LIMIT tasks are deleted
+- Any view + filter combination is a bitwise and/or of the masks (see select), returned aligned with the userdata rows
+"""
+
+import bisect
+from datetime import datetime
+
+from utils import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# category columns with a mask per value
+CATEGORIES = ["Status", "Task Importance", "Task Type"]
+
+# number of deleted tasks (dead slots) after which the masks are compacted
+TOMBSTONE_LIMIT = 100
+
+
+def task_keys(task):
+    """
+    - Returns the (column, value) masks a task (row of the typed userdata) is part of
+    - Missing was late (ongoing tasks) is part of neither the late nor the on-time mask
+    """
+
+    keys = [(column, task[column]) for column in CATEGORIES if not pd.isna(task[column])]
+
+    if not pd.isna(task["Was Late"]):
+        keys.append(("Was Late", bool(task["Was Late"])))
+
+    if task["Is Outlier"] == True:
+        keys.append(("Is Outlier", True))
+
+    return keys
+
+
+class Masks:
+
+    def __init__(self, userdata, deadlines=None):
+        """
+        - Builds the masks from the typed userdata, each column is only compared once
+        - If the deadline index of the userdata is given, the ongoing late view is read from it
+        """
+
+        # number of slots used (live and dead) and of slots allocated in every mask
+        self.size = len(userdata)
+        self.capacity = self.size
+
+        # dead slots (deleted tasks), sorted
+        self.dead = []
+
+        self.deadlines = deadlines
+
+        # (column, value) : boolean array, True for the rows with that value
+        self.masks = {}
+
+        for column in CATEGORIES:
+            codes, values = pd.factorize(userdata[column])
+
+            for code, value in enumerate(values):
+                self.masks[(column, value)] = codes == code
+
+        was_late = userdata["Was Late"]
+
+        self.masks[("Was Late", True)] = (was_late == True).fillna(False).to_numpy(dtype=bool)
+        self.masks[("Was Late", False)] = (was_late == False).fillna(False).to_numpy(dtype=bool)
+        self.masks[("Is Outlier", True)] = (userdata["Is Outlier"] == True).to_numpy(dtype=bool)
+
+    @property
+    def rows(self):
+        # number of tasks, ie rows of the userdata
+        return self.size - len(self.dead)
+
+    def aligned(self, mask):
+        """
+        - Returns a mask of the slots as a mask of the userdata rows, dead slots are dropped
+        """
+
+        mask = mask[:self.size]
+
+        return np.delete(mask, self.dead) if self.dead else mask
+
+    def slot(self, position):
+        # rows of the userdata are the live slots in order, so every dead slot up to the row shifts it by one
+        slot = position
+
+        for dead in self.dead:
+            if dead > slot:
+                break
+            slot += 1
+
+        return slot
+
+    def slot_mask(self, column, value):
+        # mask of the slots with value in column
+        mask = self.masks.get((column, value))
+
+        return mask[:self.size] if mask is not None else np.zeros(self.size, dtype=bool)
+
+    def get(self, column, value):
+        """
+        - Returns the mask of the rows with value in column (all False if no task has it)
+        """
+
+        return self.aligned(self.slot_mask(column, value))
+
+    def any(self, column, values):
+        """
+        - Returns the mask of the rows with any of the values in column, 'all' keeps every row
+        """
+
+        if isinstance(values, str) and values == "all":
+            return np.ones(self.rows, dtype=bool)
+
+        mask = np.zeros(self.size, dtype=bool)
+
+        for value in values:
+            mask |= self.slot_mask(column, value)
+
+        return self.aligned(mask)
+
+    def view(self, userdata, view):
+        """
+        - Returns the mask of a status view of select_view() (all, ongoing, ongoing late, completed, on-time, late, outlier)
+        """
+
+        ongoing = self.slot_mask("Status", "Ongoing")
+
+        match view:
+
+            case "ongoing":
+                return self.aligned(ongoing)
+
+            case "ongoing late":
+                # deadlines depend on the current time, so they are only compared for the ongoing tasks
+                mask = np.zeros(self.rows, dtype=bool)
+
+                if self.deadlines is not None:
+                    mask[userdata.index.get_indexer(self.deadlines.overdue())] = True
+                    return mask
+
+                rows = np.flatnonzero(self.aligned(ongoing))
+                mask[rows] = userdata["Deadline"].to_numpy()[rows] < np.datetime64(datetime.today().replace(microsecond=0))
+                return mask
+
+            case "completed":
+                return self.aligned(~ongoing)
+
+            case "on-time":
+                return self.aligned(~ongoing & self.slot_mask("Was Late", False))
+
+            case "late":
+                return self.aligned(~ongoing & self.slot_mask("Was Late", True))
+
+            case "outlier":
+                return self.get("Is Outlier", True)
+
+        return np.ones(self.rows, dtype=bool)
+
+    def select(self, userdata, importances="all", types="all", view="all"):
+        """
+        - Returns the mask of the tasks matching the filters and the view (same as the filters of query())
+        """
+
+        return self.any("Task Importance", importances) & self.any("Task Type", types) & self.view(userdata, view)
+
+    def update(self, position, before, after):
+        """
+        - Applies a change of the task at position (row number in the userdata)
+        - before/after are the rows of the task before and after the change (None if added/deleted)
+        - An added task (always the last row of the userdata) gets the next slot, a deleted task's slot is marked as dead
+        - Only the masks of the task are written, the arrays are only copied when they grow or are compacted
+        """
+
+        if before is None:
+            if self.size == self.capacity:
+                self.grow()
+
+            slot = self.size
+            self.size += 1
+
+        else:
+            slot = self.slot(position)
+
+            for key in task_keys(before):
+                self.masks[key][slot] = False
+
+        if after is None:
+            bisect.insort(self.dead, slot)
+
+            if len(self.dead) >= TOMBSTONE_LIMIT:
+                self.compact()
+            return
+
+        for key in task_keys(after):
+            if key not in self.masks:
+                self.masks[key] = np.zeros(self.capacity, dtype=bool)
+
+            self.masks[key][slot] = True
+
+    def grow(self):
+        """
+        - Doubles the slots allocated in every mask, so adding tasks only copies the masks now and then
+        """
+
+        self.capacity = max(2 * self.capacity, 16)
+
+        for key, mask in self.masks.items():
+            grown = np.zeros(self.capacity, dtype=bool)
+            grown[:self.size] = mask[:self.size]
+            self.masks[key] = grown
+
+    def compact(self):
+        """
+        - Drops the dead slots from every mask at once
+        """
+
+        for key, mask in self.masks.items():
+            self.masks[key] = self.aligned(mask)
+
+        self.size = self.capacity = self.rows
+        self.dead = []
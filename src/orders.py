@@ -0,0 +1,151 @@
+"""
+- Sorted orders (permutations of the task ids) of the tasks of a user, kept sorted as tasks change
+- An order is built the first time its sorters are used, then adding, editing or deleting a task only
+  removes/inserts the task's key with a binary search instead of sorting all the tasks again
+- Orders match sort_values() : missing values last (first for the quick view), ties in task id order
+"""
+
+import bisect
+
+from utils import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# sorters of the quick view : ongoing first, then completed on - descending, deadline - ascending
+QUICK_VIEW = (("Completed On", False), ("Deadline", True))
+
+
+class Descending:
+    """
+    - Wraps a value so it sorts in reverse, used for descending text fields (datetimes are negated instead)
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+def key_parts(column, ascending, na_first):
+    """
+    - Returns the sort key part of every value of a userdata column as a list
+    - A part is (missing flag, value), the flag puts missing values first or last whatever the direction
+    """
+
+    missing = column.isna().to_numpy()
+
+    if pd.api.types.is_datetime64_any_dtype(column):
+        values = np.where(missing, 0, column.to_numpy().astype("datetime64[ns]").astype("int64"))
+        values = (values if ascending else -values).tolist()
+
+    else:
+        values = column.astype(object).where(~missing, "").tolist()
+        values = values if ascending else [Descending(value) for value in values]
+
+    return list(zip((missing != na_first).astype(int).tolist(), values))
+
+
+def task_part(value, ascending, na_first):
+    """
+    - Returns the sort key part of a single value of a task, same as key_parts()
+    """
+
+    missing = pd.isna(value)
+
+    if isinstance(value, (pd.Timestamp, np.datetime64)) or (missing and value is pd.NaT):
+        value = 0 if missing else pd.Timestamp(value).as_unit("ns").value
+        value = value if ascending else -value
+
+    else:
+        value = "" if missing else value
+        value = value if ascending else Descending(value)
+
+    return (int(missing != na_first), value)
+
+
+class SortedOrder:
+
+    def __init__(self, userdata, sorters, na_first=False):
+        """
+        - Builds the order of the typed userdata for sorters, a list of (field, ascending) pairs
+        """
+
+        self.sorters = tuple(sorters)
+        self.na_first = na_first
+
+        fields = [field for field, _ in self.sorters]
+
+        # the columns are sorted by pandas first, so sorting the keys afterwards only goes through them once
+        userdata = userdata[fields].sort_values(by=fields, ascending=[ascending for _, ascending in self.sorters], na_position="first" if na_first else "last", kind="stable")
+
+        parts = [key_parts(userdata[field], ascending, na_first) for field, ascending in self.sorters]
+
+        # sorted keys, a key is the parts of every sorter followed by the task id
+        self.keys = sorted(zip(*parts, userdata.index.tolist()))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def key(self, taskid, task):
+        return tuple(task_part(task[field], ascending, self.na_first) for field, ascending in self.sorters) + (int(taskid),)
+
+    def add(self, taskid, task):
+        bisect.insort(self.keys, self.key(taskid, task))
+
+    def remove(self, taskid, task):
+        key = self.key(taskid, task)
+        i = bisect.bisect_left(self.keys, key)
+
+        if i < len(self.keys) and self.keys[i] == key:
+            del self.keys[i]
+
+    def update(self, taskid, before, after):
+        """
+        - Applies a change of a task, before/after are the rows of the task before and after the change (None if added/deleted)
+        """
+
+        if before is not None:
+            self.remove(taskid, before)
+
+        if after is not None:
+            self.add(taskid, after)
+
+    def ids(self, start=0, stop=None):
+        """
+        - Returns the task ids from position start to stop of the order, only those keys are read
+        """
+
+        return [key[-1] for key in self.keys[start:stop]]
+
+
+class Orders:
+    """
+    - Every sorted order used so far for a user's tasks, kept up to date together
+    """
+
+    def __init__(self):
+        # (sorters, na_first) : order
+        self.orders = {}
+
+    def get(self, userdata, sorters, na_first=False):
+        """
+        - Returns the order of userdata for sorters, built the first time it is asked for
+        """
+
+        key = (tuple(sorters), na_first)
+
+        if key not in self.orders:
+            self.orders[key] = SortedOrder(userdata, sorters, na_first)
+
+        return self.orders[key]
+
+    def update(self, taskid, before, after):
+        for order in self.orders.values():
+            order.update(taskid, before, after)
@@ -0,0 +1,122 @@
+"""
+- Pages through a listing of tasks instead of printing all of them at once
+- A listing is the task ids in display order, only the rows of the page shown are selected and formatted
+- Commands : enter/'n' next page, 'p' previous page, a page number, 't <task id>' jump to the page of a task,
+  's <size>' change the page size, 'q' stop
+"""
+
+import os
+
+from utils import lazy_import
+
+np = lazy_import("numpy")
+
+# number of tasks shown per page when TASK_ANALYZER_PAGE_SIZE isn't set (or isn't valid)
+DEFAULT_PAGE_SIZE = 20
+
+
+def page_size_setting():
+    """
+    - Returns the page size set with the TASK_ANALYZER_PAGE_SIZE environment variable
+    - A value which isn't a positive whole number falls back to DEFAULT_PAGE_SIZE, so a bad setting never stops the program
+    """
+
+    try:
+        size = int(os.environ.get("TASK_ANALYZER_PAGE_SIZE", DEFAULT_PAGE_SIZE))
+
+    except ValueError:
+        return DEFAULT_PAGE_SIZE
+
+    return size if size > 0 else DEFAULT_PAGE_SIZE
+
+
+# number of tasks shown per page
+PAGE_SIZE = page_size_setting()
+
+
+def page_count(total, size):
+    # an empty listing still has a single (empty) page
+    return max(1, -(-total // size))
+
+
+def page(data, ids, number, size=PAGE_SIZE):
+    """
+    - Returns the rows of data on page number (from 0) of the listing ids
+    """
+
+    return data.loc[ids[number * size:(number + 1) * size]]
+
+
+def find_page(ids, taskid, size=PAGE_SIZE):
+    """
+    - Returns the page number (from 0) the task is on, None if it isn't in the listing
+    """
+
+    positions = np.flatnonzero(ids == taskid)
+
+    if len(positions) == 0:
+        return None
+
+    return int(positions[0]) // size
+
+
+def page_tasks(data, ids, size=PAGE_SIZE):
+    """
+    - Shows the tasks of data in the order of ids (array of task ids), a page at a time
+    - A listing with a single page is shown without asking anything
+    """
+
+    ids = np.asarray(ids)
+    number = 0
+
+    while True:
+        pages = page_count(len(ids), size)
+        number = min(number, pages - 1)
+
+        print(f"\nPage {number + 1} of {pages} ({len(ids)} tasks)")
+        print(page(data, ids, number, size))
+
+        if pages == 1:
+            return
+
+        while True:
+            ask = input("\nEnter for next page, 'p' for previous, a page number, 't <task id>', 's <page size>' or 'q' to stop : ").strip().lower()
+
+            if ask in ["", "n"]:
+                # after the last page the listing stops
+                if number == pages - 1:
+                    return
+
+                number += 1
+                break
+
+            elif ask == "p":
+                number = max(number - 1, 0)
+                break
+
+            elif ask == "q":
+                return
+
+            elif ask.isdigit() and 1 <= int(ask) <= pages:
+                number = int(ask) - 1
+                break
+
+            elif ask.startswith("t") and ask[1:].strip().isdigit():
+                found = find_page(ids, int(ask[1:].strip()), size)
+
+                if found is None:
+                    print("\nTask not found in this listing")
+                    continue
+
+                number = found
+                break
+
+            elif ask.startswith("s") and ask[1:].strip().isdigit() and int(ask[1:].strip()) > 0:
+                # the page with the first task of the current page is kept
+                first = number * size
+                size = int(ask[1:].strip())
+                number = first // size
+                break
+
+            else:
+                print("\nInvalid command")
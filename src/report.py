@@ -0,0 +1,152 @@
+"""
+- Report over many users (eg every user in users.csv), the users are loaded and analysed in a pool of processes
+- Each worker loads a user and sends back its userstats, analysis and running aggregates (a few cells, not the tasks)
+- The aggregates of all the users are merged into the global analysis, same metrics as analysing all their tasks together
+- Rows of the report : profile stats and analysis of every user, then of all the users together ('All Users')
+- With percentiles, the p50/p90/p99 of delay and duration are reported instead of the analysis (sketches are merged the same way)
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from login import Login, USERS_FILE, BACKEND
+from aggregates import Aggregates, KEYS
+from analyse import analyse, detailed_analysis, percentile_analysis
+from storage import SQLiteStorage
+from users import UsersRegistry
+from utils import lazy_import
+
+pd = lazy_import("pandas")
+
+# user of the global rows
+ALL_USERS = "All Users"
+
+# userstats summed over the users, on-time rate is computed again from the sums
+STATS = ["Total Tasks", "Completed Tasks", "Ongoing Tasks", "Late Tasks"]
+
+# users registry and database connection of the worker process, opened once per process
+worker = {}
+
+
+def start_worker():
+    # run once in every worker process (and in this process when there's a single worker)
+    worker["users"] = UsersRegistry(USERS_FILE)
+    worker["storage"] = SQLiteStorage() if BACKEND == "sqlite" else None
+
+
+def analysis(userdata, aggregates, detailed=False, percentiles=False):
+    """
+    - Returns the analysis of every importance and type (or every combination if detailed) read from the aggregates
+    - With percentiles, the percentiles are returned instead, in the same layout as the analysis
+    """
+
+    if percentiles:
+        return percentile_rows(userdata, aggregates, detailed)
+
+    if detailed:
+        return detailed_analysis(userdata, aggregates)
+
+    return analyse(userdata, "all", "all", aggregates)
+
+
+def percentile_rows(userdata, aggregates, detailed=False):
+    """
+    - Returns the percentiles of every importance and type (or every combination if detailed) as rows of parameter : value
+    """
+
+    rows = []
+
+    for by in [KEYS] if detailed else KEYS:
+        data = percentile_analysis(userdata, by, aggregates)
+        fields = data.columns[:len(by) if detailed else 1]
+
+        for row in data.to_dict(orient="records"):
+            rows.extend([fields[0], *[row[field] for field in fields], parameter, row[parameter]] for parameter in data.columns[len(fields):])
+
+    columns = ["Category", "Primary Field", "Secondary Field", "Parameter", "Value"] if detailed else ["Category", "Field", "Parameter", "Value"]
+
+    return pd.DataFrame(rows, columns=columns, dtype=object)
+
+
+def user_report(username, detailed=False, percentiles=False):
+    """
+    - Loads a user and returns (username, userstats, analysis, aggregates), run in the worker processes
+    - If the user can't be loaded, returns (username, error message, None, None)
+    """
+
+    try:
+        user = Login(username, users=worker["users"], storage=worker["storage"])
+
+    except KeyError:
+        return username, "User not found", None, None
+
+    except FileNotFoundError:
+        return username, "The data file couldn't be found.", None, None
+
+    aggregates = user.aggregates
+
+    return username, user.userstats, analysis(user.userdata, aggregates, detailed, percentiles), aggregates
+
+
+def section(name, stats, data):
+    """
+    - Returns the rows of a user (or of all the users) in the report, profile stats first and then the analysis
+    """
+
+    profile = pd.DataFrame([["Profile", *[""] * (len(data.columns) - 3), stat, value] for stat, value in stats.items() if stat != "Username"], columns=data.columns, dtype=object)
+
+    data = pd.concat([profile, data], ignore_index=True)
+    data.insert(0, "User", name)
+
+    return data
+
+
+def run_report(usernames, workers=None, detailed=False, percentiles=False):
+    """
+    - Returns (report dataframe, errors) for the given users, errors lists the users which couldn't be loaded
+    - Users are spread over workers processes (every core by default), a single worker runs them in this process
+    - Rows of every user are kept in the order of usernames, followed by the rows of all the users together
+    """
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(usernames)))
+
+    if workers == 1:
+        start_worker()
+        results = [user_report(username, detailed, percentiles) for username in usernames]
+
+    else:
+        # users are sent in chunks so small users don't cost a round trip each
+        with ProcessPoolExecutor(workers, initializer=start_worker) as pool:
+            results = list(pool.map(user_report, usernames, repeat(detailed), repeat(percentiles), chunksize=max(1, len(usernames) // (workers * 4))))
+
+    sections = []
+    errors = []
+
+    totals = dict.fromkeys(STATS, 0)
+    merged = Aggregates()
+
+    for username, stats, data, aggregates in results:
+
+        if data is None:
+            errors.append(f"{username} - {stats}")
+            continue
+
+        sections.append(section(username, stats, data))
+
+        for stat in STATS:
+            totals[stat] += stats[stat]
+
+        merged.merge(aggregates)
+
+    try:
+        totals["On-Time Rate (%)"] = (totals["Completed Tasks"] - totals["Late Tasks"]) * 100 / totals["Total Tasks"]
+    except ZeroDivisionError:
+        totals["On-Time Rate (%)"] = 0
+
+    totals["Users"] = len(sections)
+
+    # merged aggregates have every value they need, so the userdata is never read
+    sections.append(section(ALL_USERS, totals, analysis(None, merged, detailed, percentiles)))
+
+    return pd.concat(sections, ignore_index=True), errors
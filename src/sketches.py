@@ -0,0 +1,135 @@
+"""
+- Mergeable quantile sketches of task delays and durations (p50, p90, p99), logarithmic histograms like DDSketch
+- Values are counted in buckets whose bounds grow by 2% each, so a quantile is within 1% of the exact value
+  (values under a second are counted as 0), whatever the number of values
+- Buckets are plain counts, so values can be removed as well as added (edited or deleted tasks), and sketches of
+  different categories or users are merged by adding their counts
+- Memory depends on the range of the values (at most about 2 * 1100 buckets for up to 100 years), not on the number of tasks
+"""
+
+import bisect
+import math
+
+from utils import lazy_import
+
+np = lazy_import("numpy")
+
+# relative accuracy of the quantiles
+ACCURACY = 0.01
+GAMMA = (1 + ACCURACY) / (1 - ACCURACY)
+
+# values closer to 0 than this (in seconds) are counted as 0
+MIN_VALUE = 1.0
+# bounds of the buckets, from MIN_VALUE up to 100 years in seconds (larger values go in the last bucket)
+BOUNDS = [MIN_VALUE * GAMMA ** i for i in range(math.ceil(math.log(100 * 365 * 86400 / MIN_VALUE, GAMMA)) + 1)]
+
+# quantiles shown in the reports
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def bucket_keys(values):
+    """
+    - Returns the bucket key of every value of a numpy array, keys are ordered like the values
+    - Key 0 is for values under MIN_VALUE, i > 0 for values in (BOUNDS[i - 2], BOUNDS[i - 1]] and -i for their negatives
+    """
+
+    magnitude = np.abs(values)
+    keys = np.searchsorted(BOUNDS, magnitude, side="left") + 1
+
+    return np.where(magnitude < MIN_VALUE, 0, np.where(values < 0, -keys, keys)).astype("int64")
+
+
+def bucket_key(value):
+    # same as bucket_keys() for a single value, bisect compares with the same bounds so both always agree
+    magnitude = abs(value)
+
+    if magnitude < MIN_VALUE:
+        return 0
+
+    key = bisect.bisect_left(BOUNDS, magnitude) + 1
+
+    return -key if value < 0 else key
+
+
+def bucket_value(key):
+    """
+    - Returns the value a bucket stands for, within ACCURACY of every value in it
+    """
+
+    if key == 0:
+        return 0.0
+
+    i = min(abs(key) - 1, len(BOUNDS) - 1)
+    value = 2 * BOUNDS[i] / (GAMMA + 1)
+
+    return -value if key < 0 else value
+
+
+class Sketch:
+
+    __slots__ = ("counts", "n")
+
+    def __init__(self):
+        # bucket key : number of values
+        self.counts = {}
+        self.n = 0
+
+    def add(self, value, count=1):
+        """
+        - Adds count values (removes them if count is negative)
+        """
+
+        key = bucket_key(value)
+        total = self.counts.get(key, 0) + count
+
+        if total:
+            self.counts[key] = total
+        else:
+            del self.counts[key]
+
+        self.n += count
+
+    def remove(self, value):
+        self.add(value, -1)
+
+    def add_counts(self, keys, counts):
+        # adds the counts of many buckets at once, eg of a vectorized build
+        for key, count in zip(keys, counts):
+            self.counts[key] = self.counts.get(key, 0) + count
+            self.n += count
+
+    def merge(self, other):
+        """
+        - Returns a new sketch of the values of both sketches
+        """
+
+        sketch = Sketch()
+        sketch.add_counts(self.counts.keys(), self.counts.values())
+        sketch.add_counts(other.counts.keys(), other.counts.values())
+
+        return sketch
+
+    def quantiles(self, qs=QUANTILES):
+        """
+        - Returns the values at quantiles qs (ascending, from 0 to 1), 0 for every quantile of an empty sketch
+        - The value at q is the one of rank q * (n - 1) rounded, counting from 0, like numpy's quantile(method='nearest')
+        """
+
+        if self.n == 0:
+            return [0.0 for _ in qs]
+
+        values = []
+        keys = iter(sorted(self.counts))
+        key = None
+        seen = 0
+
+        for q in qs:
+            rank = round(q * (self.n - 1))
+
+            while seen <= rank:
+                key = next(keys)
+                seen += self.counts[key]
+
+            values.append(bucket_value(key))
+
+        return values
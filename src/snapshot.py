@@ -0,0 +1,198 @@
+"""
+- Binary snapshot cache of a user's typed userdata, stored next to the json datafile (<path>.npz)
+- Lets login skip parsing the json datafile and converting its datetime columns
+- Snapshot is only used while the datafile and journal are unchanged (checked by mtime and size)
+- Json datafile stays the source of truth, a missing or stale snapshot is simply rebuilt from it
+- Small datafiles are parsed faster than numpy can be imported, so they don't get a snapshot
+- path is the user's datafile path without extension (eg database/alex_walker)
+"""
+
+import json
+import os
+
+from utils import lazy_import
+
+# numpy and pandas are only imported when a snapshot is actually read or written
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# size (bytes) of the datafile and journal from which a snapshot is kept
+SNAPSHOT_MIN_SIZE = 2 * 1024 * 1024
+
+# layout version of the snapshot arrays, snapshots of another version are rebuilt
+SNAPSHOT_VERSION = 3
+
+# text columns, stored as their utf-8 text joined together and the offsets of every value in it
+TEXT_COLUMNS = ["Task Name", "Notes"]
+
+
+def source_size(path):
+    # size (bytes) of the user's datafile and journal
+    return sum(os.path.getsize(file) for file in [f"{path}.json", f"{path}.journal"] if os.path.exists(file))
+
+
+def snapshot_wanted(path):
+    """
+    - Returns True if the user's datafile and journal are large enough for a snapshot to be used
+    """
+
+    return source_size(path) >= SNAPSHOT_MIN_SIZE
+
+
+def file_key(path):
+    """
+    - Returns the mtime and size of the user's datafile and journal as a list, these change whenever the data is written
+    """
+
+    key = []
+
+    for file in [f"{path}.json", f"{path}.journal"]:
+        try:
+            stat = os.stat(file)
+            key += [stat.st_mtime_ns, stat.st_size]
+
+        # if there is no journal
+        except FileNotFoundError:
+            key += [0, 0]
+
+    return key
+
+
+def encode_text(values):
+    """
+    - Returns the text of a column as (utf-8 bytes of all the values joined, offsets of every value, missing values)
+    - Offsets are in characters, value i is text[offsets[i]:offsets[i + 1]], so every value takes only its own length
+    """
+
+    missing = values.isna().to_numpy(dtype=bool)
+    values = [str(j) for j in values.fillna("").tolist()]
+
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum([len(j) for j in values], out=offsets[1:])
+
+    # surrogates which made it into the datafile are kept as they are
+    text = np.frombuffer("".join(values).encode("utf-8", "surrogatepass"), dtype=np.uint8)
+
+    return text, offsets, missing
+
+
+def decode_text(text, offsets, missing):
+    """
+    - Rebuilds the values of a text column from encode_text(), as an object array
+    """
+
+    text = text.tobytes().decode("utf-8", "surrogatepass")
+    bounds = offsets.tolist()
+
+    values = np.empty(len(missing), dtype=object)
+    values[:] = [text[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+    values[missing] = None
+
+    return values
+
+
+def snapshot_key(path):
+    """
+    - Returns the file key of the user's datafile and journal as an array, a snapshot is fresh only if these match
+    """
+
+    return np.array(file_key(path), dtype=np.int64)
+
+
+def save_snapshot(path, userstats, userdata, journal_entries=0):
+    """
+    - Writes the typed userdata and userstats as arrays to the user's snapshot file
+    - Should be called right after the datafile/journal are read or written so the key matches them
+    - Nothing is written if the datafile is too small for a snapshot, or if the snapshot would be larger than the datafile
+    """
+
+    if not snapshot_wanted(path):
+        return
+
+    arrays = {
+        "version": np.array(SNAPSHOT_VERSION),
+        "key": snapshot_key(path),
+        "userstats": np.array(json.dumps(userstats)),
+        "journal_entries": np.array(journal_entries),
+        "id": userdata.index.to_numpy(dtype=np.int64),
+        "Was Late": userdata["Was Late"].astype("Int8").fillna(-1).to_numpy(dtype=np.int8),
+        "Duration": userdata["Duration"].to_numpy(dtype="timedelta64[s]"),
+        "Is Outlier": userdata["Is Outlier"].to_numpy(dtype=bool),
+    }
+
+    for column in ["Start Time", "Deadline", "Completed On"]:
+        arrays[column] = userdata[column].to_numpy(dtype="datetime64[ns]")
+
+    for column in TEXT_COLUMNS:
+        arrays[f"{column} Text"], arrays[f"{column} Offsets"], arrays[f"{column} Missing"] = encode_text(userdata[column])
+
+    # categorical columns are stored as codes into their categories
+    for column in ["Task Type", "Task Importance", "Status"]:
+        categorical = pd.Categorical(userdata[column])
+        arrays[f"{column} Codes"] = categorical.codes
+        arrays[f"{column} Values"] = np.asarray(categorical.categories, dtype=str)
+
+    try:
+        # a snapshot larger than the datafile would be slower to read than the datafile itself
+        if sum(array.nbytes for array in arrays.values()) > source_size(path):
+            if os.path.exists(f"{path}.npz"):
+                os.remove(f"{path}.npz")
+            return
+
+        # written to a temporary file first so a partial snapshot is never loaded
+        with open(f"{path}.npz.tmp", "wb") as f:
+            np.savez(f, **arrays)
+
+        os.replace(f"{path}.npz.tmp", f"{path}.npz")
+
+    # the snapshot is only a cache, login still works without it
+    except OSError:
+        pass
+
+
+def load_snapshot(path):
+    """
+    - Returns (userstats, build, journal_entries) from the user's snapshot file, build() returns the userdata dataframe
+    - Arrays are read right away but the dataframe (and pandas) is only built when build() is called
+    - Returns None if there is no snapshot or it doesn't match the current datafile and journal
+    """
+
+    try:
+        with np.load(f"{path}.npz") as f:
+
+            if int(f["version"]) != SNAPSHOT_VERSION or not np.array_equal(f["key"], snapshot_key(path)):
+                return None
+
+            arrays = dict(f)
+
+        userstats = json.loads(str(arrays["userstats"]))
+
+    # a missing or unreadable snapshot is rebuilt from the datafile
+    except (OSError, KeyError, ValueError):
+        return None
+
+    def build():
+        was_late = arrays["Was Late"]
+
+        # rebuilds a categorical column from its codes and categories
+        def decode(column):
+            return pd.Categorical.from_codes(arrays[f"{column} Codes"], arrays[f"{column} Values"].astype(object))
+
+        return pd.DataFrame(
+            {
+                "Task Name": decode_text(arrays["Task Name Text"], arrays["Task Name Offsets"], arrays["Task Name Missing"]),
+                "Task Type": decode("Task Type"),
+                "Task Importance": decode("Task Importance"),
+                "Start Time": arrays["Start Time"],
+                "Deadline": arrays["Deadline"],
+                "Completed On": arrays["Completed On"],
+                "Status": decode("Status"),
+                "Was Late": pd.arrays.BooleanArray(was_late == 1, was_late == -1),
+                "Duration": arrays["Duration"],
+                "Is Outlier": arrays["Is Outlier"],
+                "Notes": decode_text(arrays["Notes Text"], arrays["Notes Offsets"], arrays["Notes Missing"]),
+            },
+            index=pd.Index(arrays["id"]),
+        )
+
+    return userstats, build, int(arrays["journal_entries"])
@@ -0,0 +1,269 @@
+"""
+- SQLite storage backend for userstats and userdata (used instead of the json datafiles when selected)
+- Tasks of all users are stored in a single indexed table
+- Loading and saving use the same dict layout as the json datafiles
+- Only the userstats are read at login, tasks are read when every task is needed (eg an analysis)
+- Filtered, sorted task views are run as queries on the database
+- Migrating the existing json datafiles : python src/storage.py migrate
+"""
+
+import sqlite3
+import json
+import sys
+from datetime import datetime
+
+# file path of the sqlite database
+SQLITE_FILE = "database/tasks.db"
+
+# userdata field : table column
+FIELDS = {
+    "Task Name": "name",
+    "Task Type": "type",
+    "Task Importance": "importance",
+    "Start Time": "start_time",
+    "Deadline": "deadline",
+    "Completed On": "completed_on",
+    "Was Late": "was_late",
+    "Duration": "duration",
+    "Is Outlier": "is_outlier",
+    "Notes": "notes",
+}
+
+# status views of the tasks and the condition of each view
+VIEWS = {
+    "all": "1",
+    "ongoing": "completed_on IS NULL",
+    "ongoing late": "completed_on IS NULL AND deadline < :now",
+    "completed": "completed_on IS NOT NULL",
+    "on-time": "completed_on IS NOT NULL AND was_late = 0",
+    "late": "completed_on IS NOT NULL AND was_late = 1",
+    "outlier": "is_outlier = 1",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS userstats (
+    username TEXT PRIMARY KEY,
+    stats TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    username TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    name TEXT,
+    type TEXT,
+    importance TEXT,
+    start_time TEXT,
+    deadline TEXT,
+    completed_on TEXT,
+    was_late INTEGER,
+    duration TEXT,
+    is_outlier INTEGER,
+    notes TEXT,
+    PRIMARY KEY (username, id)
+);
+CREATE INDEX IF NOT EXISTS tasks_type ON tasks (username, type);
+CREATE INDEX IF NOT EXISTS tasks_importance ON tasks (username, importance);
+CREATE INDEX IF NOT EXISTS tasks_deadline ON tasks (username, deadline);
+CREATE INDEX IF NOT EXISTS tasks_completed_on ON tasks (username, completed_on);
+"""
+
+
+def to_row(fields):
+    """
+    - Converts the fields of a task (as stored in the datafile) into table column values
+    """
+
+    row = {FIELDS[key]: value for key, value in fields.items() if key in FIELDS}
+
+    # ongoing tasks have no completion date
+    if row.get("completed_on") == "Ongoing":
+        row["completed_on"] = None
+
+    return row
+
+
+def to_fields(row):
+    """
+    - Converts a row of the tasks table into the fields of a task (as stored in the datafile)
+    """
+
+    fields = {key: row[column] for key, column in FIELDS.items()}
+
+    if fields["Completed On"] is None:
+        fields["Completed On"] = "Ongoing"
+
+    if fields["Was Late"] is not None:
+        fields["Was Late"] = bool(fields["Was Late"])
+
+    fields["Is Outlier"] = bool(fields["Is Outlier"])
+
+    return fields
+
+
+class SQLiteStorage:
+
+    def __init__(self, path=SQLITE_FILE):
+
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def load_stats(self, username):
+        """
+        - Returns the userstats of a user, without reading any task
+        - Raises FileNotFoundError if the user has no data in the database
+        """
+
+        stats = self.connection.execute("SELECT stats FROM userstats WHERE username = ?", (username,)).fetchone()
+
+        if stats is None:
+            raise FileNotFoundError(username)
+
+        return json.loads(stats["stats"])
+
+    def load_tasks(self, username):
+        """
+        - Returns all the tasks of a user as userdata in the same layout as the json datafile
+        """
+
+        rows = self.connection.execute("SELECT * FROM tasks WHERE username = ? ORDER BY id", (username,))
+
+        return {str(row["id"]): to_fields(row) for row in rows}
+
+    def categories(self, username, field):
+        """
+        - Returns the distinct values of a field (eg 'Task Type') among the tasks of a user, in the order they first appear
+        - Read from the index of the field, the tasks themselves aren't loaded
+        """
+
+        rows = self.connection.execute(f"SELECT {FIELDS[field]} FROM tasks WHERE username = ? GROUP BY {FIELDS[field]} ORDER BY MIN(id)", (username,))
+
+        return [row[0] for row in rows]
+
+    def save(self, username, userstats, userdata):
+        """
+        - Replaces all the userstats and userdata of a user in one transaction
+        - userdata is a dict of task id : task fields (as stored in the datafile)
+        """
+
+        with self.connection:
+            self.connection.execute("DELETE FROM tasks WHERE username = ?", (username,))
+            self.connection.execute("INSERT OR REPLACE INTO userstats VALUES (?, ?)", (username, json.dumps(userstats)))
+
+            for taskid, fields in userdata.items():
+                self.insert_task(username, taskid, fields)
+
+    def insert_task(self, username, taskid, fields):
+        """
+        - Inserts (or replaces) a single task row, doesn't commit
+        """
+
+        row = to_row(fields)
+        columns = ", ".join(["username", "id"] + list(row))
+        values = ", ".join("?" * (len(row) + 2))
+
+        self.connection.execute(f"INSERT OR REPLACE INTO tasks ({columns}) VALUES ({values})", [username, int(taskid)] + list(row.values()))
+
+    def save_task(self, username, taskid, action, fields, userstats):
+        """
+        - Saves a single task change along with the current userstats
+        - action can be 'insert', 'update' (only the changed fields are updated) or 'delete'
+        """
+
+        with self.connection:
+
+            if action == "insert":
+                self.insert_task(username, taskid, fields)
+
+            elif action == "update":
+                row = to_row(fields)
+                columns = ", ".join(f"{column} = ?" for column in row)
+
+                self.connection.execute(f"UPDATE tasks SET {columns} WHERE username = ? AND id = ?", list(row.values()) + [username, int(taskid)])
+
+            else:
+                self.connection.execute("DELETE FROM tasks WHERE username = ? AND id = ?", (username, int(taskid)))
+
+            self.connection.execute("UPDATE userstats SET stats = ? WHERE username = ?", (json.dumps(userstats), username))
+
+    def query(self, username, importances, types, sorters, view="all"):
+        """
+        - Returns the tasks of a user matching the importances, types and status view as datafile-layout userdata
+        - sorters is a list of (field, ascending) pairs, ties are sorted by task id
+        - Empty values (ongoing tasks' completion, was late) are sorted last in either order
+        """
+
+        importances = list(importances)
+        types = list(types)
+
+        order = [f"{FIELDS[field]} IS NULL, {FIELDS[field]} {'ASC' if ascending else 'DESC'}" for field, ascending in sorters]
+
+        sql = (
+            f"SELECT * FROM tasks WHERE username = ? "
+            f"AND importance IN ({', '.join('?' * len(importances))}) "
+            f"AND type IN ({', '.join('?' * len(types))}) "
+            f"AND {VIEWS[view].replace(':now', '?')} "
+            f"ORDER BY {', '.join(order + ['id'])}"
+        )
+
+        parameters = [username] + importances + types
+
+        if ":now" in VIEWS[view]:
+            parameters.append(str(datetime.today().replace(microsecond=0)))
+
+        rows = self.connection.execute(sql, parameters)
+
+        return {row["id"]: to_fields(row) for row in rows}
+
+    def rename_user(self, username, new):
+        """
+        - Moves the userstats and tasks of a user to a new username
+        """
+
+        with self.connection:
+            self.connection.execute("UPDATE userstats SET username = ? WHERE username = ?", (new, username))
+            self.connection.execute("UPDATE tasks SET username = ? WHERE username = ?", (new, username))
+
+    def delete_user(self, username):
+        """
+        - Permanently removes the userstats and tasks of a user
+        """
+
+        with self.connection:
+            self.connection.execute("DELETE FROM userstats WHERE username = ?", (username,))
+            self.connection.execute("DELETE FROM tasks WHERE username = ?", (username,))
+
+
+def migrate(path=SQLITE_FILE):
+    """
+    - Imports the json datafiles (and any unsaved journal changes) of all users into the sqlite database
+    - Existing data of the same users in the database is replaced
+    """
+
+    from login import USERS_FILE, DATABASE, replay_journal
+    from users import UsersRegistry
+
+    storage = SQLiteStorage(path)
+
+    for username in UsersRegistry(USERS_FILE):
+        try:
+            with open(f"{DATABASE}/{username}.json", "r") as f:
+                data = json.load(f)
+
+        except FileNotFoundError:
+            print(f"Skipping {username}, the data file couldn't be found.")
+            continue
+
+        replay_journal(data, f"{DATABASE}/{username}.journal")
+        storage.save(username, data["userstats"], data["userdata"])
+
+        print(f"Migrated {username} - {len(data['userdata'])} tasks")
+
+
+if __name__ == "__main__":
+
+    if sys.argv[1:] == ["migrate"]:
+        migrate()
+
+    else:
+        print("Usage : python src/storage.py migrate")
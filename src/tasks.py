@@ -3,30 +3,192 @@
 - View profile : view profile/user stats
 - Quick view tasks : Either a task id or all, pre-sorted (Completed on - descending, deadline - ascending)
 - View tasks : allows user to filter and sort, and view tasks
+- Deadline tasks : shows ongoing tasks which are overdue or due in the next hours
+- Import tasks : adds many tasks at once from a csv or ndjson file
 - Add task : allows user to add task
 - Edit task : allows user to edit task fields and mark as complete,outlier by task id
 - Delete task : allows user to permanently delete the task from database by task id
 """
 
-import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from utils import to_time, to_date, comb_datetime, consent
+from utils import to_time, to_date, comb_datetime, consent, lazy_import
+from login import load_userdata
+from orders import QUICK_VIEW
+from pager import page_tasks
+from instrument import phase
+
+# numpy and pandas are only imported once the tasks are actually used
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
 
 # task categories and importance categories user can select from
 taskcategories = ["Work", "Study", "Health", "Social", "Rest", "Personal", "Others"]
 importancecategories = ["Low", "Medium", "High"]
 
+# the kept sorted order is used by query() when at least 1 / ORDER_SHARE of the tasks are selected
+ORDER_SHARE = 4
+
+
+def select_view(userdata, view):
+    """
+    - Returns the tasks of userdata which are in the given status view
+    - Views : all, ongoing, ongoing late, completed, on-time, late, outlier
+    """
+
+    ongoing = userdata["Status"] == "Ongoing"
+
+    match view:
+
+        case "ongoing":
+            return userdata[ongoing]
+
+        case "ongoing late":
+            return userdata[ongoing & (userdata["Deadline"] < datetime.today().replace(microsecond=0))]
+
+        case "completed":
+            return userdata[~ongoing]
+
+        case "on-time":
+            return userdata[~ongoing & (userdata["Was Late"] == False)]
+
+        case "late":
+            return userdata[~ongoing & (userdata["Was Late"] == True)]
+
+        case "outlier":
+            return userdata[userdata["Is Outlier"] == True]
+
+    return userdata
+
+
+def filter_tasks(userdata, importances, types, view):
+    """
+    - Returns the tasks of userdata matching the filters and the view, comparing the columns
+    """
+
+    if not (isinstance(importances, str) and importances == "all"):
+        userdata = userdata[userdata["Task Importance"].isin(importances)]
+
+    if not (isinstance(types, str) and types == "all"):
+        userdata = userdata[userdata["Task Type"].isin(types)]
+
+    return select_view(userdata, view)
+
+
+def query_ids(userdata, importances="all", types="all", sorters=(), view="all", masks=None, orders=None):
+    """
+    - Returns the ids (array) of the tasks of userdata matching the filters, in sorted order
+    - importances and types are lists of values to keep, or 'all'
+    - sorters is a list of (field, ascending) pairs, eg [("Deadline", True), ("Task Name", False)]
+    - view is a status view of select_view()
+    - If the masks of userdata are given, the filters and view are a single combined mask instead of comparing the columns
+    - If the sorted orders of userdata are given (with the masks), most of the tasks are read in the kept order instead of sorted
+    """
+
+    with phase("filter", len(userdata)):
+        if masks is not None:
+            mask = masks.select(userdata, importances, types, view)
+
+        else:
+            index = filter_tasks(userdata, importances, types, view).index
+
+    if masks is not None:
+        # reading the kept order goes through every task, so a small selection is sorted on its own instead
+        if orders is not None and sorters and mask.sum() * ORDER_SHARE >= len(mask):
+            with phase("sort (kept order)", len(userdata)):
+                ids = np.array(orders.get(userdata, sorters).ids(), dtype="int64")
+
+                return ids[mask[userdata.index.get_indexer(ids)]]
+
+        index = userdata.index[mask]
+
+    if sorters:
+        with phase("sort", len(index)):
+            # only the sorted columns of the selected tasks are sorted
+            fields = [field for field, _ in sorters]
+            index = userdata.loc[index, fields].sort_values(by=fields, ascending=[ascending for _, ascending in sorters]).index
+
+    return index.to_numpy()
+
+
+def query(userdata, importances="all", types="all", sorters=(), view="all", masks=None, orders=None):
+    """
+    - Returns the tasks of userdata matching the filters, sorted, without asking or printing anything
+    - Same arguments as query_ids()
+    """
+
+    return userdata.loc[query_ids(userdata, importances, types, sorters, view, masks, orders)]
+
+
+def quick_view_ids(userdata, orders=None):
+    """
+    - Returns the ids (array) of all tasks sorted the quick view way : ongoing first, then completed on - descending, deadline - ascending
+    - If the sorted orders of userdata are given, the ids are read in the kept quick view order instead of sorted
+    """
+
+    with phase("sort (quick view)", len(userdata)):
+        if orders is not None:
+            return np.array(orders.get(userdata, QUICK_VIEW, na_first=True).ids(), dtype="int64")
+
+        return userdata[["Completed On", "Deadline"]].sort_values(by=["Completed On", "Deadline"], ascending=[False, True], na_position="first").index.to_numpy()
+
+
+def quick_view(userdata, orders=None):
+    """
+    - Returns all tasks sorted the quick view way, without asking or printing anything
+    """
+
+    return userdata.loc[quick_view_ids(userdata, orders)]
+
+
+def overdue_tasks(userdata, deadlines=None, now=None):
+    """
+    - Returns the ongoing tasks with a deadline before now (default current time), earliest deadline first
+    - If the deadline index of userdata is given, only the overdue tasks are read instead of comparing every deadline
+    """
+
+    if deadlines is not None:
+        return userdata.loc[deadlines.overdue(now)]
+
+    if now is None:
+        now = datetime.today().replace(microsecond=0)
+
+    ongoing = userdata[userdata["Status"] == "Ongoing"]
+
+    return ongoing[ongoing["Deadline"] < now].sort_values(by="Deadline", kind="stable")
+
+
+def due_tasks(userdata, hours, deadlines=None, now=None):
+    """
+    - Returns the ongoing tasks due in the next hours (deadline from now up to now + hours), earliest deadline first
+    - If the deadline index of userdata is given, only the tasks due are read instead of comparing every deadline
+    """
+
+    if deadlines is not None:
+        return userdata.loc[deadlines.due(hours, now)]
+
+    if now is None:
+        now = datetime.today().replace(microsecond=0)
+
+    ongoing = userdata[userdata["Status"] == "Ongoing"]
+    due = (ongoing["Deadline"] >= now) & (ongoing["Deadline"] <= now + timedelta(hours=hours))
+
+    return ongoing[due].sort_values(by="Deadline", kind="stable")
+
 
 class Tasks:
 
     def __init__(self, login_object):
 
         # database is stored centrally to update everywhere
-        self.userdata = login_object.userdata
         self.userstats = login_object.userstats
         self.io = login_object
 
+    @property
+    def userdata(self):
+        # userdata is read from the login object, so it's only built when a task feature is first used
+        return self.io.userdata
+
     def view_profile(self):
         """
         Shows user stats - total tasks, completed on, etc
@@ -56,19 +218,17 @@ class Tasks:
 
         if task_id == "all":
 
-            # userdata copy is made so as to not affect centralised data
-            userdata = self.userdata.copy()
-            # userdata is sorted by default
-            userdata = userdata.sort_values(by=["Completed On", "Deadline"], ascending=[False, True])
+            # userdata is sorted by default, only the ids are sorted and each page is formatted when shown
+            ids = quick_view_ids(self.userdata, self.io.orders)
 
-            print(userdata)
+            page_tasks(self.userdata, ids)
 
             # asks user if they want to export this data to an external json file
             print("\nDo you want to export this data to an external json file?")
             ask = consent()
 
             if ask:
-                self.io.custom_export(userdata)
+                self.io.custom_export(self.userdata, ids)
             return
 
         try:
@@ -89,20 +249,17 @@ class Tasks:
         # shows user profile/stats
         self.view_profile()
 
-        # if no tasks are added to the database
-        if len(self.userdata) == 0:
-            print("\nYou do not have any tasks added")
-            return
-
-        # userdata copy is made to ensure centralised data is not affected
-        userdata = self.userdata.copy()
-
         ask_imp = []
         ask_type = []
 
-        # task importance and type in the database are added to list
-        category_importance = self.userdata["Task Importance"].unique()
-        category_tasks = self.userdata["Task Type"].unique()
+        # task importance and type in the database are added to list (read from the database with the sqlite backend)
+        category_importance = self.io.categories("Task Importance")
+        category_tasks = self.io.categories("Task Type")
+
+        # if no tasks are added to the database
+        if len(category_tasks) == 0:
+            print("\nYou do not have any tasks added")
+            return
 
         # shows the task importance user can filter IN
         print("\nYou can filter by task importance :")
@@ -169,10 +326,6 @@ class Tasks:
             if not esc:
                 break
 
-        # filters out the data as per user's input
-        userdata = userdata[userdata["Task Importance"].isin(ask_imp)]
-        userdata = userdata[userdata["Task Type"].isin(ask_type)]
-
         # presents user with sort options
         sort_options = {"1": "Task Type", "2": "Task Importance", "3": "Start Time", "4": "Deadline", "5": "Completed On", "6": "Task Name",}
 
@@ -229,8 +382,7 @@ class Tasks:
         primary_preferance = sort_options[primary_preferance]
         secondary_preferance = sort_options[secondary_preferance]
 
-        # sorts the data as per user's preferance
-        userdata = userdata.sort_values(by=[primary_preferance, secondary_preferance], ascending=[primary_order, secondary_order])
+        sorters = [(primary_preferance, primary_order), (secondary_preferance, secondary_order)]
 
         # asks user which tasks they want to view
         while True:
@@ -243,31 +395,31 @@ class Tasks:
 
                 case "1":
                     # shows all tasks
-                    output = userdata
+                    view = "all"
 
                 case "2":
                     # shows all ongoing tasks
-                    output = userdata[userdata["Completed On"] == "Ongoing"]
+                    view = "ongoing"
 
                 case "3":
                     # shows all ongoing + late tasks
-                    output = userdata[userdata["Completed On"] == "Ongoing" & userdata["Deadline"] < datetime.today().replace(microsecond=0)]
+                    view = "ongoing late"
 
                 case "4":
                     # shows all completed tasks
-                    output = userdata[userdata["Completed On"] != "Ongoing"]
+                    view = "completed"
 
                 case "5":
                     # shows all tasks completed on time
-                    output = userdata[userdata["Completed On"] != "Ongoing" & userdata["Was Late"] == False]
+                    view = "on-time"
 
                 case "6":
                     # shows all tasks completed late
-                    output = userdata[userdata["Completed On"] != "Ongoing" & userdata["Was Late"] == True]
+                    view = "late"
 
                 case "7":
                     # shows all the outlier tasks
-                    output = userdata[userdata["Is Outlier"] == True]
+                    view = "outlier"
 
                 case "0":
                     # if user wants to exit
@@ -278,20 +430,93 @@ class Tasks:
                     print("\nEnter a valid code")
                     continue
 
+            if self.io.storage is not None:
+                # only the matching tasks are loaded from the database
+                output = load_userdata(self.io.storage.query(self.io.username, ask_imp, ask_type, sorters, view))
+                ids = output.index.to_numpy()
+
+            else:
+                # filters are combined from the maintained masks, only the ids of the matching tasks are sorted
+                output = self.userdata
+                ids = query_ids(self.userdata, ask_imp, ask_type, sorters, view, self.io.masks, self.io.orders)
+
             # if no tasks are found matching user's preferances
-            if len(output) == 0:
+            if len(ids) == 0:
                 print("No such tasks found")
 
             else:
-                print()
-                print(output)
+                # each page is formatted when shown
+                page_tasks(output, ids)
 
                 # asks user if they want to export the data to an external file
                 print("\nDo you want to export this data to an external json file?")
                 ask = consent()
 
                 if ask:
-                    self.io.custom_export(output)
+                    self.io.custom_export(output, ids)
+
+    def deadline_tasks(self):
+        """
+        - Shows the ongoing tasks which are overdue, or due in the next hours (asked, enter for 24)
+        - Tasks are shown earliest deadline first
+        - Asks user if they want to export the output data to a json file
+        """
+
+        # if no tasks are added to the database
+        if len(self.userdata) == 0:
+            print("\nYou do not have any tasks added")
+            return
+
+        print("\nYou can view :")
+        print(" 1. Overdue Tasks \n 2. Tasks Due Soon")
+
+        while True:
+            view_type = input("\nEnter the code of view type : ").strip()
+
+            if view_type in ["1", "2"]:
+                break
+
+            print("\nEnter a valid code")
+
+        if view_type == "1":
+            # deadlines are read from the deadline index, completed tasks aren't looked at
+            output = overdue_tasks(self.userdata, self.io.deadlines)
+
+        else:
+            # asks user for the number of hours to look ahead
+            while True:
+                hours = input("\nEnter the number of hours (or enter for 24) : ").strip()
+
+                if hours == "":
+                    hours = 24
+                    break
+
+                try:
+                    hours = float(hours)
+
+                    if hours > 0:
+                        break
+
+                except ValueError:
+                    pass
+
+                print("\nPlease enter a positive number of hours")
+
+            output = due_tasks(self.userdata, hours, self.io.deadlines)
+
+        # if no tasks are found
+        if len(output) == 0:
+            print("No such tasks found")
+            return
+
+        page_tasks(output, output.index.to_numpy())
+
+        # asks user if they want to export the data to an external file
+        print("\nDo you want to export this data to an external json file?")
+        ask = consent()
+
+        if ask:
+            self.io.custom_export(output)
 
     def add_task(self):
         """
@@ -353,8 +578,6 @@ class Tasks:
             else:
                 print("\nDeadline Date-Time cannot be older than Start Date-Time")
 
-        self.userdata.loc[taskid, "Deadline"] = deadline_datetime
-
         # allows user to add notes for the task, or enter to skip
         notes = input("\nEnter notes for the task (optional) : ")
 
@@ -366,13 +589,17 @@ class Tasks:
 
         if ask:
             # if user agrees, task is added to database and userstats is updated
-            self.userdata.loc[taskid, :] = [taskname, tasktype, importance, start_datetime, deadline_datetime, "Ongoing", pd.NA, pd.NA, False, notes]
+            self.userdata.loc[taskid, :] = [taskname, tasktype, importance, start_datetime, deadline_datetime, pd.NaT, "Ongoing", pd.NA, pd.NaT, False, notes]
+
+            # adding a row turns the boolean column into objects, it's converted back to keep the compact schema
+            self.userdata["Is Outlier"] = self.userdata["Is Outlier"].astype(bool)
 
             self.userstats["Ongoing Tasks"] += 1
             self.userstats["Total Tasks"] += 1
 
-            # udpated the userdata and userstats in the datafile
-            self.io.export_data()
+            # adds the new task and updated userstats to the user's journal
+            self.io.task_changed(taskid, None, self.userdata.loc[taskid])
+            self.io.export_task(taskid, "insert")
 
             print(f"\nTask added successfully with ID - {taskid}")
             print("Use edit task command to mark as complete or edit.")
@@ -382,6 +609,52 @@ class Tasks:
             print("Cancelling add task command.")
             return
 
+    def import_tasks(self):
+        """
+        - Allows user to add many tasks at once from a csv or ndjson file (eg history from another tracker)
+        - The whole file is validated first, nothing is added if any row is invalid
+        - Userstats are updated once and all the tasks are saved in a single write
+        """
+
+        # importer uses the categories of this module, so it's imported when needed
+        from importer import read_tasks, parse_tasks
+
+        path = input("\nEnter the path of the csv/ndjson file to import or 'cancel' : ").strip()
+
+        if path.lower() == "cancel":
+            return
+
+        try:
+            raw = read_tasks(path)
+
+        except (OSError, ValueError) as E:
+            print(f"\n{E}")
+            return
+
+        # imported tasks get ids after the last task
+        first_id = int(self.userdata.index.max()) + 1 if len(self.userdata) else 1
+
+        tasks, errors = parse_tasks(raw, first_id)
+
+        if errors:
+            print("\nThe file could not be imported :")
+            for error in errors:
+                print(f" - {error}")
+            return
+
+        completed = int((tasks["Status"] != "Ongoing").sum())
+
+        # confirms if user wants to import the tasks
+        print(f"\nYou are about to import {len(tasks)} tasks : {completed} completed ({int(tasks['Was Late'].sum())} late), {len(tasks) - completed} ongoing")
+        ask = consent()
+
+        if ask:
+            self.io.add_tasks(tasks)
+            print(f"\nTasks imported successfully with IDs {first_id} - {first_id + len(tasks) - 1}")
+
+        else:
+            print("Cancelling import command.")
+
     def edit_task(self):
         """
         - Allows user to edit task name, type, importance, start/deadline datetime, notes
@@ -403,6 +676,10 @@ class Tasks:
 
         taskid = int(taskid)
 
+        # fields of the task before editing, only the changed fields are saved
+        previous = self.io.task_record(taskid)
+        before = self.userdata.loc[taskid].copy()
+
         # shows the current field values of the task
         print("\nTask Info :")
         print(self.userdata.loc[taskid, :])
@@ -471,7 +748,7 @@ class Tasks:
                         if start_datetime <= self.userdata.loc[taskid, "Deadline"]:
 
                             # checks if task is completed
-                            if self.userdata.loc[taskid, "Completed On"] != "Ongoing":
+                            if self.userdata.loc[taskid, "Status"] != "Ongoing":
 
                                 # if task is completed, checks if start time is before complesion date
                                 if (start_datetime <= self.userdata.loc[taskid, "Completed On"]):
@@ -487,7 +764,10 @@ class Tasks:
                             print("\nStart date must be older than deadline")
 
                     self.userdata.loc[taskid, "Start Time"] = start_datetime
-                    self.userdata.loc[taskid, "Duration"] = str(self.userdata.loc[taskid, "Completed On"] - self.userdata.loc[taskid, "Start Time"])
+
+                    # duration is only updated if the task is completed
+                    if self.userdata.loc[taskid, "Status"] != "Ongoing":
+                        self.userdata.loc[taskid, "Duration"] = self.userdata.loc[taskid, "Completed On"] - self.userdata.loc[taskid, "Start Time"]
 
                 case "5":
                     # allows user to edit the deadline
@@ -506,7 +786,7 @@ class Tasks:
                     self.userdata.loc[taskid, "Deadline"] = deadline_datetime
 
                     # changes the userstats and userdata depending on if the update changed the was late statud
-                    if self.userdata.loc[taskid, "Completed On"] != "Ongoing":
+                    if self.userdata.loc[taskid, "Status"] != "Ongoing":
 
                         # checks if completion was before the deadline
                         if (self.userdata.loc[taskid, "Completed On"] <= deadline_datetime):
@@ -551,10 +831,11 @@ class Tasks:
                                 print("\nCompleted Date-Time cannot be older than Start Date-Time")
 
                         # if orignal completed status was ongoing, updates the userstats and userdata
-                        if self.userdata.loc[taskid, "Completed On"] == "Ongoing":
+                        if self.userdata.loc[taskid, "Status"] == "Ongoing":
                             self.userstats["Completed Tasks"] += 1
                             self.userstats["Ongoing Tasks"] -= 1
                         self.userdata.loc[taskid, "Completed On"] = completed_datetime
+                        self.userdata.loc[taskid, "Status"] = "Completed"
 
                         # checks if the completion is after deadline
                         if (self.userdata.loc[taskid, "Completed On"] > self.userdata.loc[taskid, "Deadline"]):
@@ -573,7 +854,7 @@ class Tasks:
                                 self.userstats["Late Tasks"] -= 1
 
                         # updates the task duration
-                        self.userdata.loc[taskid, "Duration"] = str(self.userdata.loc[taskid, "Completed On"] - self.userdata.loc[taskid, "Start Time"])
+                        self.userdata.loc[taskid, "Duration"] = self.userdata.loc[taskid, "Completed On"] - self.userdata.loc[taskid, "Start Time"]
 
                         # update user on time rate userstat
                         try:
@@ -585,7 +866,7 @@ class Tasks:
                         # if completion status of task if ongoing
 
                         # if orignal completion status was completed, userstats are updated
-                        if self.userdata.loc[taskid, "Completed On"] != "Ongoing":
+                        if self.userdata.loc[taskid, "Status"] != "Ongoing":
 
                             self.userstats["Ongoing Tasks"] += 1
                             self.userstats["Completed Tasks"] -= 1
@@ -603,7 +884,9 @@ class Tasks:
                             self.userstats["On-Time Rate (%)"] = 0
 
                         # completion status is set to ongoing
-                        self.userdata.loc[taskid, "Completed On"] = "Ongoing"
+                        self.userdata.loc[taskid, "Completed On"] = pd.NaT
+                        self.userdata.loc[taskid, "Status"] = "Ongoing"
+                        self.userdata.loc[taskid, "Duration"] = pd.NaT
 
                 case "7":
                     # allows user to set outlier status to true/false
@@ -627,7 +910,8 @@ class Tasks:
 
                 case "0":
                     # exits and saved the changes
-                    self.io.export_data()
+                    self.io.task_changed(taskid, before, self.userdata.loc[taskid])
+                    self.io.export_task(taskid, "update", previous)
 
                     # prints the updated task info
                     print("\nUpdated Task Info :")
@@ -670,7 +954,7 @@ class Tasks:
             self.userstats["Total Tasks"] -= 1
 
             # checks if task was ongoing and if yes, reduces it by one
-            if self.userdata.loc[taskid, "Completed On"] == "Ongoing":
+            if self.userdata.loc[taskid, "Status"] == "Ongoing":
                 self.userstats["Ongoing Tasks"] -= 1
 
             else:
@@ -687,9 +971,10 @@ class Tasks:
             except ZeroDivisionError:
                 self.userstats["On-Time Rate (%)"] = 0
 
-            # removes the tasks and saves the data to the datafile
+            # removes the tasks and saves the deletion to the user's journal
+            self.io.task_changed(taskid, self.userdata.loc[taskid], None)
             self.userdata.drop(taskid, inplace=True)
-            self.io.export_data()
+            self.io.export_task(taskid, "delete")
             print("\nTask deleted successfully")
 
         else:
@@ -0,0 +1,106 @@
+"""
+- Trends of the completed tasks over time (daily, weekly or monthly), overall or per task importance and/or type
+- Rollups are aggregates.Cell's keyed by (bucket start, importance, type), built once in one vectorized pass and
+  kept up to date as tasks are completed, edited or deleted, so a trend only reads the bucket rows instead of every task
+- Tasks are put in the bucket they were completed in, outliers are not counted (same as the analysis)
+"""
+
+from aggregates import Cell, KEYS, fill_cells
+from utils import lazy_import
+
+pd = lazy_import("pandas")
+
+# period : pandas period frequency, weeks start on monday
+PERIODS = {"daily": "D", "weekly": "W-SUN", "monthly": "M"}
+
+# grouping : columns the buckets are split by
+GROUPS = {"none": [], "importance": ["Task Importance"], "type": ["Task Type"], "both": KEYS}
+
+
+def bucket_start(completed_on, period):
+    # start of the bucket a completion time falls in
+    return pd.Timestamp(completed_on).to_period(PERIODS[period]).start_time
+
+
+class Trends:
+
+    def __init__(self, userdata):
+        """
+        - Builds the rollups of every period from the typed userdata
+        """
+
+        # period : {(bucket start, importance, type) : cell}
+        self.rollups = {period: {} for period in PERIODS}
+
+        completed = userdata[(userdata["Status"] != "Ongoing") & (userdata["Is Outlier"] != True)]
+
+        for period, frequency in PERIODS.items():
+            buckets = completed["Completed On"].dt.to_period(frequency).dt.start_time
+
+            # percentiles aren't part of the trends, so the many small cells don't keep sketches
+            fill_cells(self.rollups[period], completed, [buckets] + [completed[column] for column in KEYS], sketches=False)
+
+            # only completed tasks are in the rollups
+            for cell in self.rollups[period].values():
+                cell.tasks = cell.completed
+
+    def apply(self, task, sign):
+        """
+        - Adds (sign 1) or removes (sign -1) a task (row of the typed userdata) from the rollups of every period
+        """
+
+        if task["Status"] == "Ongoing" or task["Is Outlier"] == True:
+            return
+
+        for period, rollup in self.rollups.items():
+            key = (bucket_start(task["Completed On"], period), *[task[column] for column in KEYS])
+
+            cell = rollup.setdefault(key, Cell(sketches=False))
+            cell.apply(task, sign)
+
+            if cell.tasks == 0:
+                del rollup[key]
+
+    def update(self, taskid, before, after):
+        """
+        - Applies a change of a task, before/after are the rows of the task before and after the change (None if added/deleted)
+        """
+
+        if before is not None:
+            self.apply(before, -1)
+
+        if after is not None:
+            self.apply(after, 1)
+
+    def trend(self, period, by="none", importances="all", types="all", start=None, end=None):
+        """
+        - Returns the trend as a dataframe, a row per bucket (and value of the by columns) with completed tasks, oldest first
+        - importances and types can be lists of values or 'all', start/end limit the bucket starts (both included)
+        - Delays (completion - deadline, negative if early), their std and durations are in hours
+        """
+
+        columns = GROUPS[by]
+        groups = {}
+
+        for key, cell in self.rollups[period].items():
+            bucket, values = key[0], dict(zip(KEYS, key[1:]))
+
+            if importances != "all" and values["Task Importance"] not in importances:
+                continue
+
+            if types != "all" and values["Task Type"] not in types:
+                continue
+
+            if (start is not None and bucket < start) or (end is not None and bucket > end):
+                continue
+
+            # cells of the same bucket and group are merged
+            group = (bucket, *[values[column] for column in columns])
+            groups[group] = groups[group].merge(cell) if group in groups else cell
+
+        rows = [
+            [*group, cell.completed, cell.on_time, cell.late, cell.on_time * 100 / cell.completed, cell.delay.mean / 3600, cell.delay.std() / 3600, cell.duration.mean / 3600]
+            for group, cell in sorted(groups.items())
+        ]
+
+        return pd.DataFrame(rows, columns=["Period Start", *columns, "Completed Tasks", "On-Time Tasks", "Late Tasks", "On-Time (%)", "Average Delay (h)", "Std (h)", "Average Duration (h)"])
@@ -0,0 +1,149 @@
+"""
+- Registry of usernames and passwords, backed by the users data file (csv)
+- Usernames are indexed in a dict, so lookups don't scan all the accounts
+- Signups, password changes, renames and deletions are appended to a journal file (<users file>.journal)
+- Users file is only rewritten when the registry is compacted
+"""
+
+import csv
+import json
+import os
+
+# number of journal entries after which the journal is compacted into the users file
+JOURNAL_LIMIT = 1000
+
+
+class UsersRegistry:
+
+    def __init__(self, path):
+        """
+        - Loads the users file and applies the changes stored in its journal
+        - Raises FileNotFoundError if the users file cannot be found
+        """
+
+        self.path = path
+        self.journal = f"{path}.journal"
+
+        # records are [username, password] in file order, deleted accounts are set to None
+        self.records = []
+        # username : position of the record in records
+        self.index = {}
+
+        with open(path, "r", newline="") as f:
+            for row in csv.DictReader(f):
+                self._add(row["username"], row["password"])
+
+        self.journal_entries = 0
+
+        try:
+            with open(self.journal, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+
+                    self._apply(entry)
+                    self.journal_entries += 1
+
+        # if no changes were made since the last compaction
+        except FileNotFoundError:
+            pass
+
+    def __contains__(self, username):
+        return username in self.index
+
+    def __iter__(self):
+        return iter(list(self.index))
+
+    def __len__(self):
+        return len(self.index)
+
+    def password(self, username):
+        """
+        - Returns the password of a user, None if the user doesn't exist
+        """
+
+        if username not in self.index:
+            return None
+
+        return self.records[self.index[username]][1]
+
+    def add(self, username, password):
+        self._log({"action": "add", "username": username, "value": password})
+
+    def set_password(self, username, password):
+        self._log({"action": "password", "username": username, "value": password})
+
+    def rename(self, username, new):
+        self._log({"action": "rename", "username": username, "value": new})
+
+    def remove(self, username):
+        self._log({"action": "remove", "username": username, "value": None})
+
+    def compact(self):
+        """
+        - Rewrites the users file with all the current accounts and clears the journal
+        """
+
+        with open(f"{self.path}.tmp", "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["username", "password"])
+            writer.writerows(record for record in self.records if record is not None)
+
+        os.replace(f"{self.path}.tmp", self.path)
+
+        if os.path.exists(self.journal):
+            os.remove(self.journal)
+
+        # positions are rebuilt as deleted records are dropped from the file
+        records = [record for record in self.records if record is not None]
+        self.records = []
+        self.index = {}
+
+        for username, password in records:
+            self._add(username, password)
+
+        self.journal_entries = 0
+
+    def _add(self, username, password):
+        self.index[username] = len(self.records)
+        self.records.append([username, password])
+
+    def _apply(self, entry):
+        """
+        - Applies a single change to the records and index
+        """
+
+        username = entry["username"]
+
+        match entry["action"]:
+
+            case "add":
+                self._add(username, entry["value"])
+
+            case "password":
+                self.records[self.index[username]][1] = entry["value"]
+
+            case "rename":
+                position = self.index.pop(username)
+                self.records[position][0] = entry["value"]
+                self.index[entry["value"]] = position
+
+            case "remove":
+                self.records[self.index.pop(username)] = None
+
+    def _log(self, entry):
+        """
+        - Applies a change and appends it to the journal, compacting the journal once it has JOURNAL_LIMIT entries
+        """
+
+        self._apply(entry)
+
+        with open(self.journal, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+        self.journal_entries += 1
+
+        if self.journal_entries >= JOURNAL_LIMIT:
+            self.compact()
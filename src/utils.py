@@ -3,6 +3,37 @@
 """
 
 from datetime import datetime
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """
+    - Returns a module which is only actually imported when one of its attributes is first used
+    - Used for pandas/numpy so startup, login and profile views don't pay for importing them
+    """
+
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+
+    return module
+
+
+def imported(name):
+    """
+    - Returns True if a module has actually been imported, not just set up by lazy_import()
+    """
+
+    # lazily imported modules become plain modules once they are loaded
+    return type(sys.modules.get(name)) is type(sys)
 
 
 def consent(prompt="\nPlease enter 'Yes'/'No' : "):